@@ -0,0 +1,141 @@
+# batch_cli.py
+
+import asyncio
+import json
+import os
+import time
+import click
+from config import INDEX_PERSIST_ROOT, LLM_MAX_CONCURRENCY
+from index_registry import build_indexes_in_parallel
+from llm_client import ollama_client, OllamaError
+from llm_scheduler import PRIORITY_BULK
+from logging_utils import log_message, ConsoleColor
+from module_data import default_module_values, module_request_data, parse_module_response, plan_entry, format_plan
+from prompt_builder import build_module_prompt
+from rag_integration import run_rag_system
+from usage_meter import usage_meter
+
+BATCH_SESSION_ID = "BATCH"
+
+
+def list_books(root_dir: str) -> list:
+    """Every subfolder of the root is a book, as in Step 1 of the wizard; paths are canonical."""
+    root_dir = os.path.realpath(root_dir)
+    return sorted(os.path.join(root_dir, name) for name in os.listdir(root_dir)
+                  if os.path.isdir(os.path.join(root_dir, name)))
+
+
+def completed_books(output_path: str) -> set:
+    """Books already written successfully to the output, skipped when a run is resumed."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # truncated last line of an interrupted run
+            if record.get("status") == "ok":
+                # Canonical, so that a run on the same root spelled differently still resumes.
+                done.add(os.path.realpath(record["data_dir"]))
+    return done
+
+
+async def generate_module(values: dict, book_context: str, structure_type: str) -> dict:
+    prefix, suffix = build_module_prompt(book_context, module_request_data(values, structure_type))
+    response = await ollama_client.generate(suffix, max_tokens=1050, prefix=prefix, session_id=BATCH_SESSION_ID,
+                                            priority=PRIORITY_BULK, module_id=values["module_id"])
+    try:
+        values = {**values, **parse_module_response(response)}
+    except (ValueError, KeyError, IndexError, TypeError) as e:
+        log_message(f"Unparsable response for module {values['module_id']}: {e}", level="warning",
+                    color=ConsoleColor.YELLOW, session_id=BATCH_SESSION_ID)
+    return {**values, "response": response}
+
+
+async def generate_book(data_dir: str, persist_root: str, module_count: int, structure_type: str) -> dict:
+    started = time.monotonic()
+    record = {"book": os.path.basename(data_dir), "data_dir": data_dir}
+    try:
+        # Raises when the profile cannot be generated: the book is then recorded as failed
+        # and retried by the next run instead of being planned from an error message.
+        book_context = await asyncio.to_thread(run_rag_system, api_key=None, persist_dir=persist_root,
+                                               data_dir=data_dir, session_id=BATCH_SESSION_ID)
+        modules = await asyncio.gather(*[generate_module(default_module_values(module_id), book_context, structure_type)
+                                         for module_id in range(1, module_count + 1)])
+        entries = [plan_entry(values) for values in modules]
+        record.update(status="ok", book_profile=book_context, modules=modules, plan=entries,
+                      plan_text=format_plan(entries))
+    except (OllamaError, ValueError, OSError) as e:
+        record.update(status="error", error=str(e))
+    except Exception as e:
+        # Anything else is still one book's failure: the other books of the run go on.
+        record.update(status="error", error=repr(e))
+    record["seconds"] = round(time.monotonic() - started, 2)
+    return record
+
+
+async def generate_all(books: list, persist_root: str, output_path: str, module_count: int,
+                       structure_type: str, concurrency: int) -> list:
+    semaphore = asyncio.Semaphore(concurrency)
+    records = []
+
+    async def run(data_dir):
+        async with semaphore:
+            record = await generate_book(data_dir, persist_root, module_count, structure_type)
+        # Appended as soon as a book is done, so an interrupted run resumes from there.
+        with open(output_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        color = ConsoleColor.GREEN if record["status"] == "ok" else ConsoleColor.RED
+        error = f" ({record['error']})" if record["status"] == "error" else ""
+        log_message(f"{record['book']}: {record['status']} in {record['seconds']}s{error}", color=color,
+                    session_id=BATCH_SESSION_ID)
+        records.append(record)
+
+    await asyncio.gather(*[run(data_dir) for data_dir in books])
+    await ollama_client.aclose()
+    return records
+
+
+@click.command()
+@click.argument("root_dir", type=click.Path(exists=True, file_okay=False))
+@click.option("--output", "-o", default="aplus_plans.jsonl", show_default=True, help="JSONL file receiving one plan per book.")
+@click.option("--persist-root", default=INDEX_PERSIST_ROOT, show_default=True, help="Where book indexes are persisted.")
+@click.option("--modules", "module_count", default=4, show_default=True, help="Modules generated per book.")
+@click.option("--structure-type", default="Generate", show_default=True)
+@click.option("--index-workers", default=os.cpu_count(), show_default=True, help="Processes building indexes.")
+@click.option("--concurrency", default=LLM_MAX_CONCURRENCY, show_default=True, help="Books generated at once.")
+@click.option("--restart", is_flag=True, help="Ignore books already present in the output.")
+def main(root_dir, output, persist_root, module_count, structure_type, index_workers, concurrency, restart):
+    """Generate A+ content plans for every book (subfolder) of ROOT_DIR, without the UI."""
+    started = time.monotonic()
+    books = list_books(root_dir)
+    done = set() if restart else completed_books(output)
+    pending = [data_dir for data_dir in books if data_dir not in done]
+    log_message(f"{len(books)} books found, {len(books) - len(pending)} already done, {len(pending)} to process.",
+                color=ConsoleColor.BLUE)
+
+    index_started = time.monotonic()
+    errors = build_indexes_in_parallel(pending, persist_root, max_workers=index_workers) if pending else {}
+    with open(output, "a", encoding="utf-8") as f:
+        for data_dir, error in errors.items():
+            f.write(json.dumps({"book": os.path.basename(data_dir), "data_dir": data_dir,
+                                "status": "error", "error": error}, ensure_ascii=False) + "\n")
+    indexed = [data_dir for data_dir in pending if data_dir not in errors]
+    index_seconds = time.monotonic() - index_started
+
+    records = asyncio.run(generate_all(indexed, persist_root, output, module_count, structure_type, concurrency))
+
+    elapsed = time.monotonic() - started
+    succeeded = sum(1 for record in records if record["status"] == "ok")
+    usage = usage_meter.session_totals(BATCH_SESSION_ID)
+    click.echo(f"Books: {succeeded} ok, {len(pending) - succeeded} failed, {len(books) - len(pending)} skipped")
+    click.echo(f"Modules generated: {succeeded * module_count}")
+    click.echo(f"Indexing: {index_seconds:.1f}s, total: {elapsed:.1f}s, "
+               f"throughput: {succeeded / elapsed * 60 if elapsed else 0:.2f} books/min")
+    click.echo(f"LLM usage: {usage.summary()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+# benchmarks/pipeline_benchmark.py
+
+import asyncio
+import json
+import logging
+import math
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+from types import SimpleNamespace
+import click
+from benchmarks.stub_ollama import StubOllama
+
+WORDS = ("book", "chapter", "hero", "journey", "river", "city", "night", "letter", "memory", "war", "garden",
+         "secret", "family", "storm", "voice", "promise", "island", "silence", "machine", "winter")
+
+
+def make_corpus(root: str, documents: int, words_per_document: int, rng: random.Random) -> str:
+    os.makedirs(root, exist_ok=True)
+    for position in range(documents):
+        with open(os.path.join(root, f"chapter_{position:05d}.txt"), "w", encoding="utf-8") as f:
+            f.write(" ".join(rng.choice(WORDS) for _ in range(words_per_document)))
+    return root
+
+
+def module_payload() -> str:
+    """A complete module JSON, as the model is asked to return."""
+    from module_data import default_module_values, module_request_data
+    values = {**default_module_values(1), "title": "Discover the journey", "headline": "A story of memory",
+              "subheadline": "Told through letters", "testimonials": "Unputdownable. - A reader"}
+    return json.dumps(module_request_data(values, "Generate"), indent=2)
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def bench_rag(work_dir: str, sizes: list, words: int, rng: random.Random, stub: StubOllama) -> list:
+    from index_registry import index_registry
+    from rag_integration import run_rag_system
+    results = []
+    for size in sizes:
+        corpus = make_corpus(os.path.join(work_dir, f"corpus_{size}"), size, words, rng)
+        persist = os.path.join(work_dir, "indexes")
+        run = lambda: run_rag_system(api_key=None, persist_dir=persist, data_dir=corpus, session_id="BENCH")
+        before = dict(stub.requests)
+        _, cold = timed(run)
+        cold_requests = {name: stub.requests[name] - before[name] for name in before}
+        _, warm_memory = timed(run)
+        index_registry.invalidate(corpus)
+        _, warm_disk = timed(run)
+        results.append({"documents": size, "cold_seconds": cold, "warm_memory_seconds": warm_memory,
+                        "warm_disk_seconds": warm_disk, "cold_requests": cold_requests})
+        click.echo(f"run_rag_system {size:>6} docs: cold {cold:.2f}s, warm (memory) {warm_memory * 1000:.1f}ms, "
+                   f"warm (disk) {warm_disk * 1000:.1f}ms")
+    return results
+
+
+def bench_fanout(fanouts: list, stub: StubOllama, max_tokens: int = 150) -> list:
+    from config import LLM_MAX_CONCURRENCY, WIZARD_MAX_CONCURRENT_GENERATIONS
+    from openai_client import OpenAIClient
+    from wizard.ui_builder import populate_modules_in_parallel
+    # What the stub alone needs for one call; anything above the ideal schedule is app overhead.
+    call_seconds = stub.latency + min(len(stub.payload), max_tokens * 4) / 4 / stub.token_rate
+    # One wizard session: its OpenAIClient runs fewer generations at once than the scheduler allows.
+    concurrency = min(LLM_MAX_CONCURRENCY, WIZARD_MAX_CONCURRENT_GENERATIONS)
+    results = []
+    for count in fanouts:
+        wizard = SimpleNamespace(session_id=f"BENCH_FANOUT_{count}", dynamic_modules=[
+            {"id": position, "prompt": SimpleNamespace(value=f"Module {position} of a {count} module run."),
+             "size": SimpleNamespace(value="970x600px"), "execution_output": SimpleNamespace(set_text=lambda text: None)}
+            for position in range(1, count + 1)])
+        _, seconds = timed(lambda: asyncio.run(populate_modules_in_parallel(wizard, OpenAIClient())))
+        ideal = math.ceil(count / concurrency) * call_seconds
+        results.append({"modules": count, "seconds": seconds, "modules_per_second": count / seconds,
+                        "ideal_seconds": ideal, "overhead_seconds": seconds - ideal})
+        click.echo(f"populate_modules_in_parallel {count:>3} modules: {seconds:.2f}s "
+                   f"({count / seconds:.1f}/s, ideal {ideal:.2f}s)")
+    return results
+
+
+def bench_parse(payload: str, iterations: int) -> dict:
+    """Cost of parse_and_fill_ui without the websocket: parsing plus assigning the field values."""
+    from module_data import default_module_values, parse_module_response
+    inputs = {key: SimpleNamespace(value=None) for key in default_module_values(1)}
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for key, value in parse_module_response(payload).items():
+            if key in inputs:
+                inputs[key].value = value
+    per_response = (time.perf_counter() - started) / iterations
+    click.echo(f"parse_and_fill_ui: {per_response * 1e6:.1f}us per response ({len(payload)} bytes)")
+    return {"iterations": iterations, "payload_bytes": len(payload), "seconds_per_response": per_response}
+
+
+def bench_end_to_end(work_dir: str, documents: int, words: int, modules: int, rng: random.Random) -> dict:
+    from batch_cli import generate_book
+    corpus = make_corpus(os.path.join(work_dir, "book_end_to_end"), documents, words, rng)
+    record = asyncio.run(generate_book(corpus, os.path.join(work_dir, "indexes"), modules, "Generate"))
+    click.echo(f"end to end, {documents} docs and {modules} modules: {record['seconds']:.2f}s ({record['status']})")
+    return {"documents": documents, "modules": modules, "seconds": record["seconds"], "status": record["status"]}
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+@click.command()
+@click.option("--sizes", default="10,100,500", show_default=True, help="Documents per synthetic corpus.")
+@click.option("--words", default=400, show_default=True, help="Words per document.")
+@click.option("--fanout", default="4,16,64", show_default=True, help="Module counts for the fan-out runs.")
+@click.option("--modules", default=4, show_default=True, help="Modules generated in the end-to-end run.")
+@click.option("--latency", default=0.05, show_default=True, help="Stub time to first token, in seconds.")
+@click.option("--token-rate", default=500.0, show_default=True, help="Stub tokens per second.")
+@click.option("--parse-iterations", default=2000, show_default=True)
+@click.option("--seed", default=0, show_default=True)
+@click.option("--output", "-o", default="benchmark_results.json", show_default=True, help="JSON results file.")
+def main(sizes, words, fanout, modules, latency, token_rate, parse_iterations, seed, output):
+    """Measure the app's own overhead against a stub Ollama server with known latency."""
+    output = os.path.abspath(output)
+    stub = StubOllama(module_payload(), latency=latency, token_rate=token_rate).start()
+    # Set before the app modules are imported: the Ollama clients read it at import.
+    os.environ["OLLAMA_API_URL"] = stub.url
+    rng = random.Random(seed)
+    revision = git_revision()
+    with tempfile.TemporaryDirectory(prefix="aplus_bench_") as work_dir:
+        # Relative cache paths of the config (responses, embeddings) now point inside work_dir.
+        os.chdir(work_dir)
+        from logging_utils import configure_logging
+        configure_logging()
+        logging.getLogger().setLevel(logging.WARNING)
+
+        results = {
+            "meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "git_revision": revision,
+                     "python": platform.python_version(), "platform": platform.platform(),
+                     "stub": {"latency": latency, "token_rate": token_rate, "payload_bytes": len(stub.payload)},
+                     "words_per_document": words},
+            "run_rag_system": bench_rag(work_dir, [int(size) for size in sizes.split(",")], words, rng, stub),
+            "populate_modules_in_parallel": bench_fanout([int(count) for count in fanout.split(",")], stub),
+            "parse_and_fill_ui": bench_parse(stub.payload, parse_iterations),
+            "end_to_end": bench_end_to_end(work_dir, int(sizes.split(",")[0]), words, modules, rng),
+        }
+    stub.stop()
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    click.echo(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
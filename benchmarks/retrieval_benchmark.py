@@ -0,0 +1,126 @@
+# benchmarks/retrieval_benchmark.py
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import click
+import numpy as np
+from llama_index.core.schema import TextNode, NodeRelationship, RelatedNodeInfo
+from llama_index.core.vector_stores import SimpleVectorStore
+from llama_index.core.vector_stores.types import VectorStoreQuery
+from vector_store import MmapVectorStore
+
+DEFAULT_STORE_FILE = "default__vector_store.json"
+
+# Run in a fresh interpreter, so that the RSS added by the load is not hidden by earlier allocations.
+LOAD_PROBE = """
+import json, resource, time
+from llama_index.core.vector_stores import SimpleVectorStore
+from vector_store import MmapVectorStore
+rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+started = time.perf_counter()
+store = {load}
+seconds = time.perf_counter() - started
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before
+print(json.dumps({{"seconds": seconds, "rss_mb": rss_kb / 1024}}))
+"""
+
+
+def synthetic_embeddings(count: int, dim: int, rng) -> np.ndarray:
+    """Clustered vectors, closer to real chunk embeddings than uniform noise."""
+    centers = rng.standard_normal((max(1, count // 200), dim))
+    rows = centers[rng.integers(0, len(centers), count)] + 0.5 * rng.standard_normal((count, dim))
+    return rows.astype(np.float32)
+
+
+def build_stores(embeddings: np.ndarray) -> tuple:
+    nodes = []
+    for position, embedding in enumerate(embeddings):
+        node = TextNode(id_=f"node-{position}", text="", embedding=embedding.tolist())
+        node.relationships[NodeRelationship.SOURCE] = RelatedNodeInfo(node_id=f"doc-{position // 50}")
+        nodes.append(node)
+    default_store, matrix_store = SimpleVectorStore(), MmapVectorStore()
+    default_store.add(nodes)
+    matrix_store.add(nodes)
+    # Reading the matrix normalizes the added rows into it: done here, outside the timings.
+    materialized = matrix_store.matrix
+    assert materialized.shape == embeddings.shape
+    return default_store, matrix_store
+
+
+def timed(fn) -> tuple:
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def probe_load(load: str) -> dict:
+    """Seconds and RSS (MB) taken by the `load` expression, in a fresh interpreter."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, "-c", LOAD_PROBE.format(load=load)],
+                            cwd=root, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def compare_loads(sizes: list, dim: int, rng):
+    """Persist both stores, then time reopening each and record the RSS the load adds."""
+    click.echo(f"{'chunks':>8} {'default load':>13} {'default RSS':>12} {'matrix load':>12} {'matrix RSS':>11}")
+    for size in sizes:
+        default_store, matrix_store = build_stores(synthetic_embeddings(size, dim, rng))
+        with tempfile.TemporaryDirectory() as persist_dir:
+            # Same path as StorageContext.persist gives; the matrix store writes its own files next to it.
+            default_path = os.path.join(persist_dir, DEFAULT_STORE_FILE)
+            default_store.persist(persist_path=default_path)
+            matrix_store.persist(persist_path=default_path)
+            default = probe_load(f"SimpleVectorStore.from_persist_path({default_path!r})")
+            matrix = probe_load(f"MmapVectorStore.from_persist_dir({persist_dir!r})")
+        click.echo(f"{size:>8} {default['seconds'] * 1000:>11.0f}ms {default['rss_mb']:>9.0f} MB "
+                   f"{matrix['seconds'] * 1000:>10.0f}ms {matrix['rss_mb']:>8.0f} MB")
+
+
+@click.command()
+@click.option("--sizes", default=None, help="Comma-separated chunk counts.  [default: 1000,10000,100000; "
+                                            "1000,10000 with --load, the JSON store being slow to reload]")
+@click.option("--dim", default=384, show_default=True, help="Embedding dimensions.")
+@click.option("--queries", default=15, show_default=True, help="Queries per batch (the A1 questions).")
+@click.option("--top-k", default=4, show_default=True)
+@click.option("--seed", default=0, show_default=True)
+@click.option("--load", is_flag=True, help="Compare the time and memory it takes to reopen persisted stores instead.")
+def main(sizes, dim, queries, top_k, seed, load):
+    """Compare top-k search of the matrix store with llama_index's SimpleVectorStore.
+
+    Both stores hold the same synthetic embeddings; the default store is exact, so recall
+    is the share of its top-k ids also returned by the matrix store. With --load, both are
+    persisted and reopened instead: the JSON store is parsed, the matrix memory-mapped.
+    """
+    rng = np.random.default_rng(seed)
+    sizes = [int(size) for size in (sizes or ("1000,10000" if load else "1000,10000,100000")).split(",")]
+    if load:
+        compare_loads(sizes, dim, rng)
+        return
+    click.echo(f"{'chunks':>8} {'default/query':>14} {'matrix/query':>13} {'matrix batch':>13} {'speedup':>8} {'recall':>7}")
+    for size in sizes:
+        embeddings = synthetic_embeddings(size, dim, rng)
+        default_store, matrix_store = build_stores(embeddings)
+        query_embeddings = (embeddings[rng.integers(0, size, queries)]
+                            + 0.5 * rng.standard_normal((queries, dim))).astype(np.float32).tolist()
+
+        default_results, default_seconds = timed(lambda: [
+            default_store.query(VectorStoreQuery(query_embedding=embedding, similarity_top_k=top_k))
+            for embedding in query_embeddings])
+        _, single_seconds = timed(lambda: [
+            matrix_store.query(VectorStoreQuery(query_embedding=embedding, similarity_top_k=top_k))
+            for embedding in query_embeddings])
+        batch_results, batch_seconds = timed(lambda: matrix_store.query_batch(query_embeddings, top_k))
+
+        found = sum(len(set(expected.ids) & set(result.ids)) for expected, result in zip(default_results, batch_results))
+        recall = found / (len(query_embeddings) * min(top_k, size))
+        click.echo(f"{size:>8} {default_seconds / queries * 1000:>12.2f}ms {single_seconds / queries * 1000:>11.2f}ms "
+                   f"{batch_seconds * 1000:>11.2f}ms {default_seconds / batch_seconds:>7.0f}x {recall:>7.3f}")
+
+
+if __name__ == "__main__":
+    main()
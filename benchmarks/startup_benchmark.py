@@ -0,0 +1,46 @@
+# benchmarks/startup_benchmark.py
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import click
+
+HEAVY_MODULES = ["nicegui", "httpx", "llama_index.core", "numpy", "PyQt5", "tiktoken"]
+
+# Run in a fresh interpreter so that nothing is already imported or cached in memory.
+PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - started
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{"seconds": seconds, "rss_mb": rss_kb / 1024,
+                  "loaded": [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+
+def probe(module: str) -> dict:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)],
+                            cwd=root, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+@click.command()
+@click.option("--module", "modules", multiple=True, default=["main"], show_default=True,
+              help="Module to import; can be repeated.")
+@click.option("--runs", default=5, show_default=True)
+def main(modules, runs):
+    """Time the import of the app entry point and report peak RSS and the heavy packages it loads."""
+    for module in modules:
+        samples = [probe(module) for _ in range(runs)]
+        seconds = statistics.median(sample["seconds"] for sample in samples)
+        rss = statistics.median(sample["rss_mb"] for sample in samples)
+        click.echo(f"{module}: import {seconds * 1000:.0f} ms (median of {runs}), peak RSS {rss:.0f} MB")
+        click.echo(f"  heavy packages loaded: {', '.join(samples[-1]['loaded']) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
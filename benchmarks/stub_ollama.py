@@ -0,0 +1,113 @@
+# benchmarks/stub_ollama.py
+
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+
+class StubOllama:
+    """Local stand-in for the Ollama `/api/generate` and `/api/embed` endpoints.
+
+    Every generation waits `latency` seconds (time to first token) and then produces
+    `payload` at `token_rate` tokens per second (4 characters per token), streamed or
+    not. Embeddings are deterministic pseudo-random vectors derived from the text.
+    """
+
+    def __init__(self, payload: str, latency: float = 0.05, token_rate: float = 500.0, embed_dim: int = 384,
+                 embed_latency: float = 0.0):
+        self.payload = payload
+        self.latency = latency
+        self.token_rate = token_rate
+        self.embed_dim = embed_dim
+        self.embed_latency = embed_latency
+        self.requests = {"generate": 0, "embed": 0}
+        self._server = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def start(self) -> "StubOllama":
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                if self.path == "/api/embed":
+                    self._send_json(stub.embed(body))
+                elif self.path == "/api/generate":
+                    stub.requests["generate"] += 1
+                    if body.get("stream"):
+                        self._stream(body)
+                    else:
+                        self._send_json(stub.generate(body))
+                else:
+                    self.send_error(404)
+
+            def _send_json(self, data: dict):
+                out = json.dumps(data).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+
+            def _stream(self, body: dict):
+                text = stub.response_text(body)
+                time.sleep(stub.latency)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                chunks = [text[start:start + 4] for start in range(0, len(text), 4)]
+                for chunk in chunks:
+                    self._write_chunk({"response": chunk, "done": False})
+                    time.sleep(1 / stub.token_rate)
+                self._write_chunk({"response": "", "done": True, **stub.counts(body, text)})
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _write_chunk(self, data: dict):
+                line = (json.dumps(data) + "\n").encode("utf-8")
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+
+            def log_message(self, *args):
+                pass
+
+        ThreadingHTTPServer.request_queue_size = 256
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def response_text(self, body: dict) -> str:
+        max_tokens = (body.get("options") or {}).get("num_predict")
+        return self.payload[:max_tokens * 4] if max_tokens else self.payload
+
+    @staticmethod
+    def counts(body: dict, text: str) -> dict:
+        return {"prompt_eval_count": len(body.get("prompt", "")) // 4, "eval_count": max(1, len(text) // 4),
+                "context": [1, 2, 3]}
+
+    def generate(self, body: dict) -> dict:
+        text = self.response_text(body)
+        time.sleep(self.latency + len(text) / 4 / self.token_rate)
+        return {"response": text, "done": True, **self.counts(body, text)}
+
+    def embed(self, body: dict) -> dict:
+        self.requests["embed"] += 1
+        time.sleep(self.embed_latency)
+        embeddings = []
+        for text in body["input"]:
+            seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+            embeddings.append(np.random.default_rng(seed).standard_normal(self.embed_dim).round(5).tolist())
+        return {"embeddings": embeddings}
@@ -0,0 +1,75 @@
+# benchmarks/ui_update_benchmark.py
+
+import asyncio
+import logging
+from types import SimpleNamespace
+import click
+from nicegui import Client, core, json as nicegui_json
+from nicegui.page import page
+from benchmarks.pipeline_benchmark import module_payload
+
+
+async def drain(client: Client):
+    """Wait until the outbox of `client` has sent everything, including the updates of deferred callbacks."""
+    for _ in range(5):
+        await asyncio.sleep(0.02)
+        while client.outbox.updates or client.outbox.messages:
+            await asyncio.sleep(0.01)
+
+
+async def measure(modules: int, rounds: int) -> list:
+    """Websocket messages and bytes sent to the browser per module fill, one module after the other.
+
+    Every round applies the same generated module JSON again: the first changes every field,
+    the next ones none.
+    """
+    from wizard.steps.modules import add_module
+    core.loop = asyncio.get_running_loop()
+    sent = []
+
+    async def record(message):
+        _, message_type, data = message
+        sent.append((message_type, len(nicegui_json.dumps(data).encode("utf-8"))))
+
+    client = Client(page("/", reconnect_timeout=1.0), request=None)
+    # What the outbox hands to the socket.io server; nothing leaves the process.
+    client.outbox._emit = record
+    with client:
+        wizard = SimpleNamespace(session_id="BENCH_UI", dynamic_modules=[], touch=lambda: None)
+        for _ in range(modules):
+            add_module(wizard)
+    client.tab_id = "benchmark"  # Connected: the outbox starts sending
+    await drain(client)
+
+    payload = module_payload()
+    results = []
+    for position in range(rounds):
+        sent.clear()
+        for module in wizard.dynamic_modules:
+            with module["container"]:
+                module["fill"](payload)
+            await drain(client)
+        # Element updates, plus the script calls ui.input makes on each value set from the server.
+        updates = sum(1 for message_type, _ in sent if message_type == "update")
+        size = sum(size for _, size in sent)
+        results.append({"round": position + 1, "messages_per_fill": len(sent) / modules,
+                        "updates_per_fill": updates / modules, "bytes_per_fill": size / modules})
+        click.echo(f"round {position + 1}: {len(sent) / modules:.1f} messages ({updates / modules:.1f} updates), "
+                   f"{size / modules:,.0f} bytes per fill")
+    client.outbox.stop()
+    return results
+
+
+@click.command()
+@click.option("--modules", default=12, show_default=True, help="Modules on the page, filled one after the other.")
+@click.option("--rounds", default=2, show_default=True, help="Times the same module JSON is applied.")
+def main(modules, rounds):
+    """Measure the websocket traffic of applying a generated module JSON to the module fields."""
+    from logging_utils import configure_logging
+    configure_logging()
+    logging.getLogger().setLevel(logging.WARNING)
+    asyncio.run(measure(modules, rounds))
+
+
+if __name__ == "__main__":
+    main()
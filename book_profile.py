@@ -0,0 +1,124 @@
+# book_profile.py
+
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from llama_index.core import Settings
+from config import PROFILE_TOP_K, PROFILE_MAX_WORKERS, PROFILE_CHUNK_CHARS, PROFILE_ANSWER_CHARS
+from logging_utils import log_message, ConsoleColor
+
+PROFILE_FILE = "book_profile.json"
+# Bump when the prompt below changes so that cached profiles are regenerated.
+PROFILE_PROMPT_VERSION = 1
+
+
+def question_prompt(question: str, passages: list) -> str:
+    """Small, bounded prompt answering one question from retrieved passages only."""
+    context = "\n---\n".join(passages) if passages else "(no relevant passage found)"
+    return ("Answer the question about the book using only the excerpts below. "
+            "Be factual and concise (at most 3 sentences). If the excerpts are not enough, say so.\n"
+            f"<Excerpts>\n{context}\n</Excerpts>\n"
+            f"Question: {question}\nAnswer:")
+
+
+def retrieve_passages(indexes: list, questions: list, top_k: int = PROFILE_TOP_K) -> list:
+    """Best `top_k` chunks for each question across the given indexes only, one list per question.
+
+    All questions are searched together: one batched similarity search per index.
+    """
+    # One embedding request for all questions: the Ollama models encode queries and chunks alike.
+    embeddings = Settings.embed_model.get_text_embedding_batch(questions)
+    candidates = [[] for _ in questions]
+    for index in indexes:
+        for position, result in enumerate(index.vector_store.query_batch(embeddings, top_k)):
+            candidates[position].extend(zip(result.similarities, result.ids, [index] * len(result.ids)))
+    passages = []
+    for results in candidates:
+        results.sort(key=lambda result: result[0], reverse=True)
+        passages.append([index.docstore.get_node(node_id).get_content()[:PROFILE_CHUNK_CHARS]
+                         for _, node_id, index in results[:top_k]])
+    return passages
+
+
+def build_book_profile(indexes: list, questions: list, generate, max_workers: int = PROFILE_MAX_WORKERS,
+                       progress=None) -> dict:
+    """Answer every question from its own retrieved context, with at most `max_workers` generations at once.
+
+    `generate` is a blocking callable taking a prompt and returning the model answer.
+    Questions whose generation fails are left out and reported in `errors`.
+    """
+    answered = [0]
+    lock = threading.Lock()
+    passages = retrieve_passages(indexes, questions)
+    prompts = {question: question_prompt(question, found) for question, found in zip(questions, passages)}
+
+    def answer(question):
+        prompt = prompts[question]
+        try:
+            return generate(prompt).strip()[:PROFILE_ANSWER_CHARS]
+        finally:
+            with lock:
+                answered[0] += 1
+                if progress:
+                    progress(f"Book profile: {answered[0]}/{len(questions)} questions", answered[0] / len(questions))
+
+    profile = {"answers": [], "errors": []}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [(question, executor.submit(answer, question)) for question in questions]
+        for question, future in futures:
+            try:
+                profile["answers"].append({"question": question, "answer": future.result()})
+            except Exception as e:
+                log_message(f"Book profile question failed ({question}): {e}", level="error", color=ConsoleColor.RED)
+                profile["errors"].append({"question": question, "error": str(e)})
+    return profile
+
+
+def profile_cache_key(fingerprint: str, questions: list, model: str) -> str:
+    payload = json.dumps([PROFILE_PROMPT_VERSION, fingerprint, model, questions])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def load_cached_profile(persist_dir: str, cache_key: str):
+    try:
+        with open(os.path.join(persist_dir, PROFILE_FILE), "r", encoding="utf-8") as f:
+            cached = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    return cached["profile"] if cached.get("cache_key") == cache_key else None
+
+
+def save_profile(persist_dir: str, cache_key: str, profile: dict):
+    os.makedirs(persist_dir, exist_ok=True)
+    tmp_path = os.path.join(persist_dir, PROFILE_FILE + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"cache_key": cache_key, "profile": profile}, f)
+    os.replace(tmp_path, os.path.join(persist_dir, PROFILE_FILE))
+
+
+def get_book_profile(indexes: list, persist_dir: str, fingerprint: str, questions: list, generate, model: str,
+                     progress=None) -> dict:
+    """Return the book profile of the selected corpora, from the on-disk cache when they did not change."""
+    cache_key = profile_cache_key(fingerprint, questions, model)
+    profile = load_cached_profile(persist_dir, cache_key)
+    if profile is not None:
+        log_message("✅ Book profile loaded from cache.", color=ConsoleColor.GREEN)
+        return profile
+
+    profile = build_book_profile(indexes, questions, generate, progress=progress)
+    if not profile["answers"]:
+        raise ValueError(f"Book profile generation failed: {profile['errors'][0]['error']}")
+    # Partial profiles are served but not cached, so the failed questions are retried next time.
+    if not profile["errors"]:
+        save_profile(persist_dir, cache_key, profile)
+    log_message(f"✅ Book profile generated ({len(profile['answers'])}/{len(questions)} questions).",
+                color=ConsoleColor.GREEN)
+    return profile
+
+
+def format_profile(profile: dict) -> str:
+    """Compact JSON rendering of a profile, meant to be embedded in generation prompts."""
+    return json.dumps({item["question"]: item["answer"] for item in profile["answers"]},
+                      ensure_ascii=False, separators=(",", ":"))
@@ -1,5 +1,7 @@
 # config.py
 
+import os
+
 LOG_CONFIG = {
     "version": 1,
     "disable_existing_loggers": False,
@@ -20,9 +22,90 @@ LOG_CONFIG = {
     }
 }
 
+# @trace: sampled fraction of calls logged (per module overrides, 0 disables), maximum
+# length of an argument summary, and arguments never logged
+TRACE_ENABLED = os.environ.get("TRACE_ENABLED", "1") != "0"
+TRACE_SAMPLE_RATE = 1.0
+TRACE_MODULE_SAMPLE_RATES = {}
+TRACE_ARG_MAX_CHARS = 80
+TRACE_REDACTED_ARGS = {"api_key", "key", "password", "token", "prompt", "prompt_text"}
+
 SUPPORTED_TEXT_FORMATS = {".txt", ".md", ".json", ".csv", ".xls", ".xlsx", ".html", ".docx", ".pdf"}
+GPT4_INPUT_PRICE_PER_1000 = 0.03
 GPT4_OUTPUT_PRICE_PER_1000 = 0.06
 
+# Ingestion: formats parsed in worker processes, worker count (None = CPU count) and the
+# number of parsed files allowed in flight before the index builder catches up
+PROCESS_POOL_FORMATS = {".pdf", ".docx", ".xls", ".xlsx"}
+INGEST_MAX_WORKERS = None
+INGEST_MAX_PENDING = 8
+
+# Server-side folder browser: navigation is restricted to this root; listings are shown
+# a page at a time, cached per directory, and folder statistics recomputed after a TTL,
+# at most DIRECTORY_STATS_CONCURRENCY folders being walked at once
+DIRECTORY_BROWSER_ROOT = os.environ.get("DIRECTORY_BROWSER_ROOT", os.path.expanduser("~"))
+DIRECTORY_PAGE_SIZE = 100
+DIRECTORY_CACHE_SIZE = 1024
+DIRECTORY_STATS_TTL = 60.0
+DIRECTORY_STATS_CONCURRENCY = 4
+
+# Persisted book indexes: one sub-directory per corpus under this root
+INDEX_PERSIST_ROOT = "./client_books"
+# Memory budget of the in-process cache of loaded indexes
+INDEX_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+OLLAMA_MODEL = "llama2"
+# Ollama HTTP client: timeouts in seconds, keep-alive connection pool sizes
+OLLAMA_CONNECT_TIMEOUT = 5.0
+OLLAMA_READ_TIMEOUT = 300.0
+OLLAMA_MAX_CONNECTIONS = 32
+OLLAMA_MAX_KEEPALIVE_CONNECTIONS = 16
+# How long Ollama keeps the model loaded after a request
+OLLAMA_KEEP_ALIVE = "30m"
+# Embeddings: local Ollama model, texts per /api/embed request, requests in flight,
+# and the on-disk cache keyed by model and chunk text
+OLLAMA_EMBED_MODEL = "nomic-embed-text"
+EMBED_REQUEST_BATCH_SIZE = 128
+EMBED_CONCURRENCY = 4
+EMBEDDING_CACHE_PATH = "./cache/embeddings.sqlite3"
+# Process-wide limit of concurrent generations sent to Ollama; excess requests are queued
+LLM_MAX_CONCURRENCY = 4
+# Queue waits longer than this (seconds) are logged
+LLM_QUEUE_WAIT_WARNING = 5.0
+# Persistent cache of LLM responses; TTL in seconds, None keeps entries until evicted
+RESPONSE_CACHE_PATH = "./cache/llm_responses.sqlite3"
+RESPONSE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+RESPONSE_CACHE_TTL = None
+# Minimum delay in seconds between two UI refreshes of a streamed response
+STREAM_UI_INTERVAL = 0.25
+
+# Histogram buckets (seconds) of the /metrics stage latencies, from parsing to indexing
+METRICS_LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+# Port of the wizard web server; one per app process when several share the session store
+WIZARD_PORT = int(os.environ.get("WIZARD_PORT", "8080"))
+
+# Wizard sessions (one per browser tab): how many may be open at once, idle time in seconds
+# before one is closed (typing or clicking in the page counts as activity, reported at most
+# every WIZARD_ACTIVITY_THROTTLE seconds), and per-session caps on generations in flight and on modules
+WIZARD_MAX_SESSIONS = 32
+WIZARD_SESSION_IDLE_TIMEOUT = 3600.0
+WIZARD_ACTIVITY_THROTTLE = 10.0
+WIZARD_MAX_CONCURRENT_GENERATIONS = 2
+WIZARD_MAX_MODULES = 12
+# Wizard session states shared by the app workers (SQLite): seconds between two snapshots
+# of a page, seconds between two write-behind flushes, age in seconds of the states deleted
+SESSION_STORE_PATH = os.environ.get("SESSION_STORE_PATH", "./cache/wizard_sessions.sqlite3")
+SESSION_SNAPSHOT_INTERVAL = 5.0
+SESSION_STORE_FLUSH_INTERVAL = 2.0
+SESSION_STORE_TTL = 7 * 24 * 3600.0
+
+# Book profile: one retrieval-grounded prompt per A1 question
+PROFILE_TOP_K = 4
+PROFILE_MAX_WORKERS = 4
+PROFILE_CHUNK_CHARS = 1200
+PROFILE_ANSWER_CHARS = 600
+
 # Detailed templates used for layout generation
 REFERENCE_LAYOUT = {
     "book_title": "[BOOK-TITLE]",
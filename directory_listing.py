@@ -0,0 +1,86 @@
+# directory_listing.py
+
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from config import SUPPORTED_TEXT_FORMATS, DIRECTORY_CACHE_SIZE, DIRECTORY_STATS_TTL
+
+
+def format_size(size: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+class DirectoryCache:
+    """Cached directory listings for the folder browser, safe to use from worker threads.
+
+    A listing is reused while the modification time of the directory is unchanged. Folder
+    statistics (count and size of the supported files, recursively) cannot be invalidated
+    that way, since nested changes do not touch the folder itself, and expire after a TTL.
+    """
+
+    def __init__(self, max_entries: int = DIRECTORY_CACHE_SIZE, stats_ttl: float = DIRECTORY_STATS_TTL):
+        self.max_entries = max_entries
+        self.stats_ttl = stats_ttl
+        self._listings = OrderedDict()  # path -> (mtime_ns, subfolder names)
+        self._stats = OrderedDict()  # path -> (computed at, (file count, total bytes))
+        self._lock = threading.Lock()
+
+    def subfolders(self, path: str) -> list:
+        """Sorted names of the non hidden subfolders of `path`."""
+        mtime_ns = os.stat(path).st_mtime_ns
+        with self._lock:
+            cached = self._listings.get(path)
+            if cached and cached[0] == mtime_ns:
+                self._listings.move_to_end(path)
+                return cached[1]
+        with os.scandir(path) as entries:
+            # DirEntry.is_dir() uses the type returned by the directory read: no stat per entry.
+            names = sorted((entry.name for entry in entries
+                            if not entry.name.startswith(".") and entry.is_dir()), key=str.lower)
+        self._put(self._listings, path, (mtime_ns, names))
+        return names
+
+    def folder_stats(self, path: str) -> tuple:
+        """(file count, total bytes) of the supported documents under `path`."""
+        with self._lock:
+            cached = self._stats.get(path)
+            if cached and time.monotonic() - cached[0] < self.stats_ttl:
+                return cached[1]
+        count, size = 0, 0
+        pending = [path]
+        while pending:
+            try:
+                with os.scandir(pending.pop()) as entries:
+                    for entry in entries:
+                        if entry.name.startswith("."):
+                            continue
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(entry.path)
+                        elif os.path.splitext(entry.name)[1].lower() in SUPPORTED_TEXT_FORMATS:
+                            count += 1
+                            size += entry.stat().st_size
+            except OSError:
+                continue
+        self._put(self._stats, path, (time.monotonic(), (count, size)))
+        return count, size
+
+    def _put(self, entries: OrderedDict, path: str, value):
+        with self._lock:
+            entries[path] = value
+            entries.move_to_end(path)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+
+    async def subfolders_async(self, path: str) -> list:
+        return await asyncio.to_thread(self.subfolders, path)
+
+    async def folder_stats_async(self, path: str) -> tuple:
+        return await asyncio.to_thread(self.folder_stats, path)
+
+
+directory_cache = DirectoryCache()
@@ -1,17 +1,87 @@
 # file_manager.py
 
+import asyncio
 import os
-from nicegui import ui
-from PyQt5.QtWidgets import QApplication, QFileDialog
+import weakref
+from nicegui import background_tasks, ui
+from config import DIRECTORY_BROWSER_ROOT, DIRECTORY_PAGE_SIZE, DIRECTORY_STATS_CONCURRENCY
+from directory_listing import directory_cache, format_size
 from logging_utils import log_message, ConsoleColor, trace
 
+def _is_inside(path: str, root: str) -> bool:
+    path, root = os.path.realpath(path), os.path.realpath(root)
+    return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
+
+# Folder walks in flight per event loop, so that a page of large folders does not take every worker thread.
+_folder_stats_slots = weakref.WeakKeyDictionary()
+
+async def _fill_folder_stats(label, path: str):
+    """Show the number and size of the supported documents of a folder once computed."""
+    loop = asyncio.get_running_loop()
+    slots = _folder_stats_slots.setdefault(loop, asyncio.Semaphore(DIRECTORY_STATS_CONCURRENCY))
+    async with slots:
+        if label.is_deleted:  # The user moved to another page or folder meanwhile
+            return
+        try:
+            count, size = await directory_cache.folder_stats_async(path)
+        except OSError:
+            return
+    if not label.is_deleted:
+        label.set_text(f"{count} documents · {format_size(size)}")
+
 @trace
-def open_directory_picker(input_field):
-    """Open a directory picker and set the chosen directory into the input field."""
+async def open_directory_picker(input_field):
+    """Browse the server's folders under DIRECTORY_BROWSER_ROOT and set the chosen one into the input field."""
+    root = os.path.realpath(DIRECTORY_BROWSER_ROOT)
+    start = input_field.value.strip() if input_field.value else ""
+    state = {"path": os.path.realpath(start) if start and _is_inside(start, root) else root, "names": []}
+
+    def render_page():
+        listing.clear()
+        first = ((pagination.value or 1) - 1) * DIRECTORY_PAGE_SIZE
+        with listing:
+            if not state["names"]:
+                ui.label("No subfolders.").classes("text-caption text-grey")
+            for name in state["names"][first:first + DIRECTORY_PAGE_SIZE]:
+                path = os.path.join(state["path"], name)
+                with ui.row().classes("items-center w-full no-wrap"):
+                    ui.button(name, icon="folder", on_click=lambda path=path: navigate(path)) \
+                        .props("flat no-caps align=left").classes("grow")
+                    stats = ui.label("…").classes("text-caption text-grey")
+                background_tasks.create(_fill_folder_stats(stats, path))
+
+    async def navigate(path: str):
+        if not _is_inside(path, root):
+            return
+        try:
+            names = await directory_cache.subfolders_async(path)
+        except OSError as e:
+            ui.notify(f"Cannot open '{path}': {e.strerror}", color="red", position="top")
+            return
+        state["path"], state["names"] = path, names
+        path_label.set_text(path)
+        up_button.set_enabled(os.path.realpath(path) != root)
+        pagination.max = max(1, -(-len(names) // DIRECTORY_PAGE_SIZE))
+        pagination.set_visibility(len(names) > DIRECTORY_PAGE_SIZE)
+        if pagination.value == 1:
+            render_page()
+        else:
+            pagination.set_value(1)
+
     try:
-        if not QApplication.instance():
-            _ = QApplication([])
-        folder = QFileDialog.getExistingDirectory(None, "Select Directory")
+        with ui.dialog() as dialog, ui.card().classes("w-[40rem] max-w-full"):
+            path_label = ui.label().classes("text-body2 font-mono break-all")
+            with ui.scroll_area().classes("w-full h-96 border"):
+                listing = ui.column().classes("w-full gap-1")
+            pagination = ui.pagination(1, 1, direction_links=True, on_change=render_page)
+            with ui.row():
+                up_button = ui.button("Up", on_click=lambda: navigate(os.path.dirname(state["path"]))).props("flat")
+                ui.button("Select this folder", on_click=lambda: dialog.submit(state["path"])) \
+                    .classes("bg-blue text-white")
+                ui.button("Cancel", on_click=lambda: dialog.submit(None)).props("flat")
+        await navigate(state["path"])
+        folder = await dialog
+        dialog.delete()
         if folder:
             input_field.value = folder
             ui.notify(f"Selected directory: {folder}", color="green", position="top")
@@ -32,27 +102,51 @@ def flush_directory(wizard):
         log_message(f"Error in flush_directory: {e}", level="error", color=ConsoleColor.RED)
         ui.notify("Failed to flush directory.", color="red", position="top")
 
-def list_subfolders(wizard):
-    """List subfolders in the selected directory and display checkboxes."""
+def selected_data_dirs(wizard) -> list:
+    """Folders to index: the ticked subfolders, or the root directory itself when it has none listed."""
+    root = wizard.root_directory_input.value.strip()
+    if not wizard.subfolder_checkboxes:
+        return [root] if root else []
+    return [os.path.join(root, folder) for folder, cb in wizard.subfolder_checkboxes if cb.value]
+
+async def list_subfolders(wizard, selected: list = ()):
+    """List subfolders in the selected directory and display checkboxes, a page at a time.
+
+    The folders in `selected` are ticked, and shown even if they are beyond the first page.
+    """
     try:
         dir_path = wizard.root_directory_input.value.strip()
-        if not os.path.isdir(dir_path):
+        if not dir_path or not await asyncio.to_thread(os.path.isdir, dir_path):
             ui.notify(f"Directory '{dir_path}' not found.", color="red", position="top")
             return
+        # Scanned in a worker thread: the root may be a slow network share.
+        subfolders = await directory_cache.subfolders_async(dir_path)
         wizard.subfolder_selection_container.clear()
         wizard.subfolder_checkboxes.clear()
-        subfolders = [f for f in os.listdir(dir_path) if os.path.isdir(os.path.join(dir_path, f))]
         if not subfolders:
             ui.notify("No subfolders found.", color="yellow", position="top")
             return
-        with wizard.subfolder_selection_container:
-            for folder in subfolders:
-                with ui.row().classes("items-center"):
-                    cb = ui.checkbox(value=False).classes("m-2")
-                    ui.label(folder).classes("m-2")
-                    wizard.subfolder_checkboxes.append((folder, cb))
+
+        def show_page(first: int, count: int = DIRECTORY_PAGE_SIZE):
+            with wizard.subfolder_selection_container:
+                for folder in subfolders[first:first + count]:
+                    with ui.row().classes("items-center"):
+                        cb = ui.checkbox(value=folder in selected).classes("m-2")
+                        ui.label(folder).classes("m-2")
+                        stats = ui.label("…").classes("m-2 text-caption text-grey")
+                        wizard.subfolder_checkboxes.append((folder, cb))
+                    background_tasks.create(_fill_folder_stats(stats, os.path.join(dir_path, folder)))
+                remaining = len(subfolders) - first - count
+                if remaining > 0:
+                    def show_more():
+                        more_button.delete()
+                        show_page(first + count)
+                    more_button = ui.button(f"Show more ({remaining} remaining)", on_click=show_more).props("flat")
+
+        last_selected = max((position for position, folder in enumerate(subfolders) if folder in selected), default=0)
+        show_page(0, max(DIRECTORY_PAGE_SIZE, last_selected + 1))
         ui.notify("Subfolders loaded.", color="green", position="top")
-        log_message("Subfolders listed successfully.", session_id=wizard.session_id)
+        log_message(f"{len(subfolders)} subfolders listed.", session_id=wizard.session_id)
     except Exception as e:
         log_message(f"Error in list_subfolders: {e}", level="error", session_id=wizard.session_id)
         ui.notify("Failed to list subfolders.", color="red", position="top")
@@ -0,0 +1,97 @@
+# index_manifest.py
+
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from config import SUPPORTED_TEXT_FORMATS
+
+MANIFEST_FILE = "manifest.json"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class CorpusChanges:
+    """Files of a corpus that differ from what its persisted index was built from."""
+    added: list = field(default_factory=list)
+    changed: list = field(default_factory=list)
+    removed: list = field(default_factory=list)
+    manifest: dict = field(default_factory=dict)  # entries of the files that are still up to date
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.added or self.changed or self.removed)
+
+
+def scan_corpus(data_dir: str) -> dict:
+    """Map every (non hidden) file of a supported format to its size and modification time."""
+    entries = {}
+    for root, dirs, files in os.walk(data_dir):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for name in sorted(files):
+            if name.startswith(".") or os.path.splitext(name)[1].lower() not in SUPPORTED_TEXT_FORMATS:
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries[os.path.relpath(path, data_dir)] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    return entries
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(persist_dir: str, embed_model: str) -> dict:
+    """Entries of the files the persisted index was built from.
+
+    Empty when there is no manifest, or when the index was embedded with another model than
+    `embed_model` (or before the model was recorded): its vectors cannot be compared with
+    the ones of the current model, so the index has to be rebuilt.
+    """
+    try:
+        with open(os.path.join(persist_dir, MANIFEST_FILE), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    if data.get("embed_model") != embed_model:
+        return {}
+    return data.get("files", {})
+
+
+def save_manifest(persist_dir: str, manifest: dict, embed_model: str, embed_dim: int = None):
+    os.makedirs(persist_dir, exist_ok=True)
+    tmp_path = os.path.join(persist_dir, MANIFEST_FILE + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"embed_model": embed_model, "embed_dim": embed_dim, "files": manifest}, f)
+    os.replace(tmp_path, os.path.join(persist_dir, MANIFEST_FILE))
+
+
+def diff_corpus(manifest: dict, data_dir: str, scan: dict = None) -> CorpusChanges:
+    """Compare the corpus on disk with a manifest.
+
+    Files whose size and mtime are unchanged are trusted without reading them; the
+    others are hashed, so that a touched but identical file is not re-indexed.
+    """
+    scan = scan if scan is not None else scan_corpus(data_dir)
+    changes = CorpusChanges()
+    for rel_path, stat in scan.items():
+        previous = manifest.get(rel_path)
+        if previous and previous["size"] == stat["size"] and previous["mtime_ns"] == stat["mtime_ns"]:
+            changes.manifest[rel_path] = previous
+            continue
+        sha256 = file_hash(os.path.join(data_dir, rel_path))
+        if previous and previous["sha256"] == sha256:
+            changes.manifest[rel_path] = {**previous, **stat}
+        elif previous:
+            changes.changed.append((rel_path, {**stat, "sha256": sha256}))
+        else:
+            changes.added.append((rel_path, {**stat, "sha256": sha256}))
+    changes.removed = [rel_path for rel_path in manifest if rel_path not in scan]
+    return changes
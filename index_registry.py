@@ -0,0 +1,304 @@
+# index_registry.py
+
+import hashlib
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import ExitStack
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from llama_index.core import Settings, VectorStoreIndex, StorageContext, load_index_from_storage
+from llama_index.core.ingestion import run_transformations
+from config import INDEX_CACHE_MAX_BYTES, INGEST_MAX_WORKERS, EMBED_REQUEST_BATCH_SIZE, EMBED_CONCURRENCY
+from index_manifest import CorpusChanges, diff_corpus, load_manifest, save_manifest, scan_corpus
+from ingestion import iter_parsed_files
+from logging_utils import log_message, ConsoleColor
+from ollama_embedding import ollama_embedding
+from vector_store import MmapVectorStore
+
+# Indexes are embedded and queried with the local Ollama model, in this process and in
+# the worker processes building them.
+Settings.embed_model = ollama_embedding
+
+
+def corpus_key(data_dir: str) -> str:
+    """Stable identifier of a corpus, derived from its absolute location."""
+    real_path = os.path.realpath(data_dir)
+    return hashlib.sha1(real_path.encode("utf-8")).hexdigest()[:16]
+
+
+def corpus_fingerprint(data_dir: str, scan: dict = None) -> str:
+    """Fingerprint of the corpus content, based on relative path, size and mtime of every file."""
+    scan = scan if scan is not None else scan_corpus(data_dir)
+    digest = hashlib.sha1()
+    for rel_path, stat in scan.items():
+        digest.update(f"{rel_path}\0{stat['size']}\0{stat['mtime_ns']}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def selection_key(data_dirs: list) -> str:
+    """Identifier of a set of corpora queried together; the corpus key itself for a single corpus."""
+    if len(data_dirs) == 1:
+        return corpus_key(data_dirs[0])
+    keys = sorted(corpus_key(data_dir) for data_dir in data_dirs)
+    return hashlib.sha1("\n".join(keys).encode("utf-8")).hexdigest()[:16]
+
+
+def selection_fingerprint(data_dirs: list) -> str:
+    if len(data_dirs) == 1:
+        return corpus_fingerprint(data_dirs[0])
+    fingerprints = sorted(f"{corpus_key(data_dir)}:{corpus_fingerprint(data_dir)}" for data_dir in data_dirs)
+    return hashlib.sha1("\n".join(fingerprints).encode("utf-8")).hexdigest()
+
+
+def corpus_persist_dir(persist_root: str, data_dir: str) -> str:
+    """Directory where the index of the given corpus is persisted."""
+    return os.path.join(persist_root, corpus_key(data_dir))
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _noop_progress(message: str, fraction: float = None):
+    pass
+
+
+def build_index(data_dir: str, persist_dir: str, progress=_noop_progress,
+                parse_workers: int = INGEST_MAX_WORKERS) -> VectorStoreIndex:
+    """Build the index of a corpus from scratch and persist it along with its manifest."""
+    scan = scan_corpus(data_dir) if os.path.isdir(data_dir) else {}
+    if not scan:
+        raise ValueError(f"🚨 No documents found in '{data_dir}'. Please add files to index.")
+    changes = diff_corpus({}, data_dir, scan)
+    index = VectorStoreIndex([], storage_context=StorageContext.from_defaults(vector_store=MmapVectorStore()))
+    _apply_changes(index, data_dir, changes, {}, progress, parse_workers)
+    index.storage_context.persist(persist_dir=persist_dir)
+    _save_manifest(index, persist_dir, changes.manifest)
+    log_message(f"✅ Index created and persisted to '{persist_dir}'.", color=ConsoleColor.GREEN)
+    return index
+
+
+def _apply_changes(index: VectorStoreIndex, data_dir: str, changes: CorpusChanges, previous: dict,
+                   progress=_noop_progress, parse_workers: int = INGEST_MAX_WORKERS):
+    """Drop the nodes of removed or edited files and embed only the new and edited ones.
+
+    Files are parsed in parallel and chunked as soon as they are parsed. Their chunks are
+    embedded together once enough are waiting to fill every concurrent embedding request,
+    so that a corpus of small files does not send one request per file. A file that fails
+    to parse is left out of the manifest so that it is retried on the next update.
+    """
+    for rel_path in changes.removed + [rel_path for rel_path, _ in changes.changed]:
+        for doc_id in previous.get(rel_path, {}).get("doc_ids", []):
+            index.delete_ref_doc(doc_id, delete_from_docstore=True)
+    entries = dict(changes.added + changes.changed)
+    parsed = iter_parsed_files(data_dir, list(entries), max_workers=parse_workers)
+    nodes, waiting = [], []  # Chunks not embedded yet, and the (rel_path, documents) they come from
+    for position, (rel_path, documents, seconds, error) in enumerate(parsed):
+        if error:
+            log_message(f"Could not parse '{rel_path}': {error}", level="error", color=ConsoleColor.RED)
+            continue
+        log_message(f"Parsed '{rel_path}' in {seconds:.2f}s ({len(documents)} documents).")
+        progress(f"Indexing {rel_path} ({position + 1}/{len(entries)})", position / len(entries))
+        nodes.extend(run_transformations(documents, Settings.transformations))
+        waiting.append((rel_path, documents))
+        if len(nodes) >= EMBED_REQUEST_BATCH_SIZE * EMBED_CONCURRENCY:
+            _insert_files(index, nodes, waiting, entries, changes.manifest)
+            nodes, waiting = [], []
+    if waiting:
+        _insert_files(index, nodes, waiting, entries, changes.manifest)
+
+
+def _save_manifest(index: VectorStoreIndex, persist_dir: str, manifest: dict):
+    """Save the manifest along with the embedding model (and dimension) of the index vectors."""
+    matrix = index.vector_store.matrix
+    save_manifest(persist_dir, manifest, ollama_embedding.model_name,
+                  int(matrix.shape[1]) if matrix is not None else None)
+
+
+def _insert_files(index: VectorStoreIndex, nodes: list, files: list, entries: dict, manifest: dict):
+    """Same as inserting the documents of `files` one by one, with all their chunks embedded in one batch.
+
+    The files are added to `manifest` once their chunks are in the index.
+    """
+    index.insert_nodes(nodes)
+    for rel_path, documents in files:
+        for document in documents:
+            index.docstore.set_document_hash(document.id_, document.hash)
+        manifest[rel_path] = {**entries[rel_path], "doc_ids": [document.doc_id for document in documents]}
+
+
+def load_or_build_index(data_dir: str, persist_dir: str, progress=_noop_progress,
+                        parse_workers: int = INGEST_MAX_WORKERS) -> VectorStoreIndex:
+    """Load the persisted index of a corpus and bring it up to date with the files on disk.
+
+    The index returned is always a new object: copies loaded earlier are never modified.
+    `progress(message, fraction)` is called as files are indexed.
+    """
+    manifest = load_manifest(persist_dir, ollama_embedding.model_name)
+    if not manifest:
+        # Never built, or embedded with another model: the persisted copy cannot be updated.
+        return build_index(data_dir, persist_dir, progress, parse_workers)
+    progress("Loading index", None)
+    try:
+        # Indexes persisted before the memory-mapped store have no vector files: rebuilt instead.
+        storage_context = StorageContext.from_defaults(
+            persist_dir=persist_dir, vector_store=MmapVectorStore.from_persist_dir(persist_dir))
+        index = load_index_from_storage(storage_context)
+        log_message(f"✅ Index loaded from '{persist_dir}'.", color=ConsoleColor.GREEN)
+    except FileNotFoundError:
+        return build_index(data_dir, persist_dir, progress, parse_workers)
+
+    changes = diff_corpus(manifest, data_dir)
+    if changes.is_empty:
+        if changes.manifest != manifest:
+            _save_manifest(index, persist_dir, changes.manifest)
+        return index
+    if not changes.manifest and not changes.added and not changes.changed:
+        raise ValueError(f"🚨 No documents found in '{data_dir}'. Please add files to index.")
+
+    _apply_changes(index, data_dir, changes, manifest, progress, parse_workers)
+    index.storage_context.persist(persist_dir=persist_dir)
+    _save_manifest(index, persist_dir, changes.manifest)
+    log_message(f"✅ Index updated in '{persist_dir}': {len(changes.added)} added, "
+                f"{len(changes.changed)} changed, {len(changes.removed)} removed.", color=ConsoleColor.GREEN)
+    return index
+
+
+def update_persisted_index(data_dir: str, persist_root: str) -> tuple:
+    """Build or update the persisted index of a corpus, without keeping it; meant for worker processes.
+
+    Returns (data_dir, seconds, error message or None).
+    """
+    started = time.monotonic()
+    try:
+        # Corpora are already spread over processes: parse inline rather than nesting pools.
+        load_or_build_index(data_dir, corpus_persist_dir(persist_root, data_dir), parse_workers=1)
+        return data_dir, time.monotonic() - started, None
+    except Exception as e:
+        return data_dir, time.monotonic() - started, str(e)
+
+
+def build_indexes_in_parallel(data_dirs: list, persist_root: str, max_workers: int = None,
+                              progress=_noop_progress) -> dict:
+    """Build or update the persisted indexes of several corpora, one worker process per corpus.
+
+    Returns the error message of every corpus that failed, by data directory.
+    """
+    max_workers = min(len(data_dirs), max_workers or os.cpu_count() or 1)
+    errors = {}
+    # spawn: the caller may be a threaded server, which must not be forked.
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = [executor.submit(update_persisted_index, data_dir, persist_root) for data_dir in data_dirs]
+        progress(f"Indexing {len(data_dirs)} folders in parallel", 0.0)
+        for position, future in enumerate(as_completed(futures)):
+            data_dir, seconds, error = future.result()
+            if error:
+                errors[data_dir] = error
+                log_message(f"Indexing failed for '{data_dir}': {error}", level="error", color=ConsoleColor.RED)
+            else:
+                log_message(f"✅ '{data_dir}' indexed in {seconds:.1f}s.", color=ConsoleColor.GREEN)
+            progress(f"Indexed {position + 1}/{len(data_dirs)} folders", (position + 1) / len(data_dirs))
+    return errors
+
+
+class IndexRegistry:
+    """Bounded LRU of loaded indexes, keyed by corpus and evicted by estimated memory footprint.
+
+    A corpus is updated by one caller at a time (per-corpus lock), so that selections sharing
+    it never persist to the same directory concurrently. A stale index is never updated in
+    place, since other runs may be querying it: the update is applied to a copy reloaded from
+    disk, which then replaces it in the LRU (vector files are replaced atomically on persist,
+    so the old copy keeps reading its own).
+    """
+
+    def __init__(self, max_bytes: int = INDEX_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # corpus key -> (fingerprint, index, footprint)
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._corpus_locks = defaultdict(threading.Lock)  # corpus key -> lock held while it is updated
+
+    def _corpus_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._corpus_locks[key]
+
+    def get_index(self, data_dir: str, persist_root: str, progress=_noop_progress) -> VectorStoreIndex:
+        """Return the index of `data_dir`, from memory when its content did not change."""
+        key = corpus_key(data_dir)
+        fingerprint = corpus_fingerprint(data_dir)
+        index = self._fresh_index(key, fingerprint)
+        if index is not None:
+            return index
+        with self._corpus_lock(key):
+            # Another caller may have brought it up to date while this one waited.
+            index = self._fresh_index(key, fingerprint)
+            if index is not None:
+                return index
+            persist_dir = os.path.join(persist_root, key)
+            index = load_or_build_index(data_dir, persist_dir, progress)
+            # The persisted stores are a good proxy of what the loaded index holds in memory.
+            footprint = _dir_size(persist_dir)
+            self._put(key, fingerprint, index, footprint)
+            return index
+
+    def _fresh_index(self, key: str, fingerprint: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] == fingerprint:
+                self._entries.move_to_end(key)
+                return entry[1]
+        return None
+
+    def get_indexes(self, data_dirs: list, persist_root: str, progress=_noop_progress) -> list:
+        """Return the indexes of several corpora, building the out-of-date ones in parallel processes."""
+        stale = [data_dir for data_dir in data_dirs if not self._is_fresh(data_dir)]
+        if len(stale) > 1:
+            # Locked in key order, so that two overlapping selections cannot deadlock.
+            with ExitStack() as stack:
+                for key in sorted({corpus_key(data_dir) for data_dir in stale}):
+                    stack.enter_context(self._corpus_lock(key))
+                stale = [data_dir for data_dir in stale if not self._is_fresh(data_dir)]
+                errors = build_indexes_in_parallel(stale, persist_root, progress=progress) if stale else {}
+                if errors:
+                    raise ValueError(next(iter(errors.values())))
+                # Their persisted copies are now newer than any copy held in memory.
+                for data_dir in stale:
+                    self.invalidate(data_dir)
+        return [self.get_index(data_dir, persist_root, progress) for data_dir in data_dirs]
+
+    def _is_fresh(self, data_dir: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(corpus_key(data_dir))
+        return entry is not None and entry[0] == corpus_fingerprint(data_dir)
+
+    def invalidate(self, data_dir: str):
+        with self._lock:
+            entry = self._entries.pop(corpus_key(data_dir), None)
+            if entry:
+                self._total_bytes -= entry[2]
+
+    def _put(self, key: str, fingerprint: str, index: VectorStoreIndex, footprint: int):
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous:
+                self._total_bytes -= previous[2]
+            self._entries[key] = (fingerprint, index, footprint)
+            self._total_bytes += footprint
+            # Always keep the most recent entry, even if it alone exceeds the budget.
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                evicted_key, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_size
+                log_message(f"Index {evicted_key} evicted from memory ({evicted_size} bytes).",
+                            color=ConsoleColor.YELLOW)
+
+
+index_registry = IndexRegistry()
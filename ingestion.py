@@ -0,0 +1,68 @@
+# ingestion.py
+
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from llama_index.core import SimpleDirectoryReader
+from config import SUPPORTED_TEXT_FORMATS, PROCESS_POOL_FORMATS, INGEST_MAX_WORKERS, INGEST_MAX_PENDING
+
+
+def is_supported(rel_path: str) -> bool:
+    return os.path.splitext(rel_path)[1].lower() in SUPPORTED_TEXT_FORMATS
+
+
+def parse_file(data_dir: str, rel_path: str) -> tuple:
+    """Parse one file of the corpus; runs in a worker process for the heavy formats.
+
+    Returns (rel_path, documents, seconds, error message or None).
+    """
+    started = time.monotonic()
+    try:
+        path = os.path.join(data_dir, rel_path)
+        documents = SimpleDirectoryReader(input_files=[path], filename_as_id=True).load_data()
+        return rel_path, documents, time.monotonic() - started, None
+    except Exception as e:
+        return rel_path, [], time.monotonic() - started, str(e)
+
+
+def _done_future(result) -> Future:
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+def iter_parsed_files(data_dir: str, rel_paths: list, max_workers: int = INGEST_MAX_WORKERS,
+                      max_pending: int = INGEST_MAX_PENDING):
+    """Yield parse_file results as files are parsed, in completion order.
+
+    PDFs, Word documents and spreadsheets are parsed in a process pool, plain text formats
+    inline. At most `max_pending` parsed files are in flight or waiting for the consumer,
+    so memory stays bounded by the window rather than by the size of the corpus.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    heavy = {rel_path for rel_path in rel_paths if os.path.splitext(rel_path)[1].lower() in PROCESS_POOL_FORMATS}
+    executor = None
+    if heavy and max_workers > 1:
+        # spawn: the caller may be a threaded server, which must not be forked.
+        executor = ProcessPoolExecutor(max_workers=min(len(heavy), max_workers),
+                                       mp_context=multiprocessing.get_context("spawn"))
+    try:
+        queue = iter(rel_paths)
+        pending = set()
+        while True:
+            for rel_path in queue:
+                if executor is not None and rel_path in heavy:
+                    pending.add(executor.submit(parse_file, data_dir, rel_path))
+                else:
+                    pending.add(_done_future(parse_file(data_dir, rel_path)))
+                if len(pending) >= max_pending:
+                    break
+            if not pending:
+                return
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
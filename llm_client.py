@@ -0,0 +1,209 @@
+# llm_client.py
+
+import asyncio
+import json
+import os
+import threading
+import time
+import httpx
+from config import (OLLAMA_MODEL, OLLAMA_CONNECT_TIMEOUT, OLLAMA_READ_TIMEOUT,
+                    OLLAMA_MAX_CONNECTIONS, OLLAMA_MAX_KEEPALIVE_CONNECTIONS,
+                    OLLAMA_KEEP_ALIVE)
+from llm_scheduler import llm_scheduler, PRIORITY_MODULE
+from logging_utils import log_message
+from response_cache import response_cache, make_key
+from singleflight import SingleFlight, AsyncSingleFlight
+from usage_meter import usage_meter, count_tokens
+
+OLLAMA_API_URL = os.environ.get("OLLAMA_API_URL", "http://ollama:11434")
+
+
+class OllamaError(ValueError):
+    """Raised when Ollama cannot be reached or answers with an error."""
+
+
+class OllamaClient:
+    """Keep-alive, connection-pooled client for the Ollama generate endpoint.
+
+    Coroutines use `generate`, which runs on the event loop; code already running in a
+    worker thread (index building, book profile) uses `generate_sync`. Both share the
+    same timeouts and pool limits. Every call waits for a slot of the process-wide
+    `llm_scheduler`, on behalf of `session_id` and with the given priority class.
+    Responses are looked up in the persistent `response_cache` first, unless
+    `regenerate` is set; concurrent non-streaming calls with the same model, prompt
+    and parameters share a single request. Token counts and latency of every
+    generation are recorded in `usage_meter` under `session_id` and `module_id`.
+
+    Async calls accept a `prefix` shared by many prompts (e.g. the instructions and
+    book profile common to every module of a book), sent in front of the prompt. With
+    the model kept loaded (`keep_alive`), the server's prompt cache finds the common
+    prefix already evaluated and only processes the prompt's own part.
+    """
+
+    def __init__(self, base_url: str = OLLAMA_API_URL, model: str = OLLAMA_MODEL):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.timeout = httpx.Timeout(OLLAMA_READ_TIMEOUT, connect=OLLAMA_CONNECT_TIMEOUT)
+        self.limits = httpx.Limits(max_connections=OLLAMA_MAX_CONNECTIONS,
+                                   max_keepalive_connections=OLLAMA_MAX_KEEPALIVE_CONNECTIONS)
+        self._async_client = None
+        self._async_loop = None
+        self._sync_client = None
+        self._lock = threading.Lock()
+        self._inflight = AsyncSingleFlight()
+        self._inflight_sync = SingleFlight()
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        # An AsyncClient is bound to the loop it was first used on.
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            if self._async_client is not None:
+                self._close_stale_client(self._async_client, self._async_loop)
+            self._async_client = httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=self.limits)
+            self._async_loop = loop
+        return self._async_client
+
+    @staticmethod
+    def _close_stale_client(client: httpx.AsyncClient, old_loop):
+        """Release the pooled connections of a client left behind by a previous loop."""
+        if old_loop.is_running() and not old_loop.is_closed():
+            asyncio.run_coroutine_threadsafe(client.aclose(), old_loop)
+            return
+        # Its connections can only be closed on their own loop, which is gone (e.g. after
+        # asyncio.run): the client is dropped and its sockets closed when it is collected.
+        log_message("Dropped the Ollama client of a finished event loop.", level="debug")
+
+    def _get_sync_client(self) -> httpx.Client:
+        with self._lock:
+            if self._sync_client is None:
+                self._sync_client = httpx.Client(base_url=self.base_url, timeout=self.timeout, limits=self.limits)
+            return self._sync_client
+
+    def _payload(self, prompt: str, max_tokens: int = None, model: str = None, stream: bool = False) -> dict:
+        # keep_alive keeps the model (and its prompt cache) loaded between the modules of a book.
+        payload = {"model": model or self.model, "prompt": prompt, "stream": stream, "keep_alive": OLLAMA_KEEP_ALIVE}
+        if max_tokens:
+            payload["options"] = {"num_predict": max_tokens}
+        return payload
+
+    @staticmethod
+    def _parse(response: httpx.Response) -> dict:
+        if response.status_code != 200:
+            raise OllamaError(f"Error with Ollama API: {response.status_code} {response.text}")
+        return response.json()
+
+    @staticmethod
+    def _record_usage(session_id, module_id, prompt: str, text: str, data: dict, started: float):
+        # Prefer the counts reported by Ollama, fall back to counting locally.
+        usage_meter.record(session_id, module_id,
+                           prompt_tokens=data.get("prompt_eval_count") or count_tokens(prompt),
+                           completion_tokens=data.get("eval_count") or count_tokens(text),
+                           wall_time=time.monotonic() - started)
+
+    def _cache_key(self, prompt: str, max_tokens: int, model: str) -> str:
+        return make_key(model or self.model, prompt, {"max_tokens": max_tokens})
+
+    async def generate(self, prompt: str, max_tokens: int = None, model: str = None,
+                       session_id: str = "GLOBAL", priority: int = PRIORITY_MODULE,
+                       regenerate: bool = False, module_id=None, prefix: str = None) -> str:
+        prompt = (prefix or "") + prompt
+        key = self._cache_key(prompt, max_tokens, model)
+        if not regenerate:
+            cached = await asyncio.to_thread(response_cache.get, key)
+            if cached is not None:
+                return cached
+        return await self._inflight.do(key, lambda: self._generate(key, prompt, max_tokens, model, session_id,
+                                                                   priority, module_id))
+
+    async def _generate(self, key, prompt, max_tokens, model, session_id, priority, module_id) -> str:
+        payload = self._payload(prompt, max_tokens, model)
+        try:
+            async with llm_scheduler.slot(session_id, priority):
+                started = time.monotonic()
+                response = await self._get_async_client().post("/api/generate", json=payload)
+        except httpx.HTTPError as e:
+            raise OllamaError(f"Error with Ollama API: {e!r}") from e
+        data = self._parse(response)
+        text = data.get("response", "")
+        self._record_usage(session_id, module_id, prompt, text, data, started)
+        if text:
+            await asyncio.to_thread(response_cache.put, key, text)
+        return text
+
+    def generate_sync(self, prompt: str, max_tokens: int = None, model: str = None,
+                      session_id: str = "GLOBAL", priority: int = PRIORITY_MODULE,
+                      regenerate: bool = False, module_id=None) -> str:
+        key = self._cache_key(prompt, max_tokens, model)
+        if not regenerate:
+            cached = response_cache.get(key)
+            if cached is not None:
+                return cached
+        return self._inflight_sync.do(key, lambda: self._generate_sync(key, prompt, max_tokens, model, session_id,
+                                                                       priority, module_id))
+
+    def _generate_sync(self, key, prompt, max_tokens, model, session_id, priority, module_id) -> str:
+        try:
+            with llm_scheduler.slot_sync(session_id, priority):
+                started = time.monotonic()
+                response = self._get_sync_client().post("/api/generate", json=self._payload(prompt, max_tokens, model))
+        except httpx.HTTPError as e:
+            raise OllamaError(f"Error with Ollama API: {e!r}") from e
+        data = self._parse(response)
+        text = data.get("response", "")
+        self._record_usage(session_id, module_id, prompt, text, data, started)
+        if text:
+            response_cache.put(key, text)
+        return text
+
+    async def stream(self, prompt: str, max_tokens: int = None, model: str = None,
+                     session_id: str = "GLOBAL", priority: int = PRIORITY_MODULE,
+                     regenerate: bool = False, module_id=None, prefix: str = None):
+        """Yield the response text piece by piece as Ollama generates it.
+
+        A cached response is yielded in one piece; a fully received stream is cached.
+        """
+        prompt = (prefix or "") + prompt
+        key = self._cache_key(prompt, max_tokens, model)
+        if not regenerate:
+            cached = await asyncio.to_thread(response_cache.get, key)
+            if cached is not None:
+                yield cached
+                return
+        payload = self._payload(prompt, max_tokens, model, stream=True)
+        pieces = []
+        try:
+            async with llm_scheduler.slot(session_id, priority), \
+                    self._get_async_client().stream("POST", "/api/generate", json=payload) as response:
+                started = time.monotonic()
+                if response.status_code != 200:
+                    await response.aread()
+                    self._parse(response)
+                # Ollama streams one JSON object per line.
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("error"):
+                        raise OllamaError(f"Error with Ollama API: {chunk['error']}")
+                    if chunk.get("response"):
+                        pieces.append(chunk["response"])
+                        yield chunk["response"]
+                    if chunk.get("done"):
+                        self._record_usage(session_id, module_id, prompt, "".join(pieces), chunk, started)
+                        if pieces:
+                            await asyncio.to_thread(response_cache.put, key, "".join(pieces))
+                        break
+        except httpx.HTTPError as e:
+            raise OllamaError(f"Error with Ollama API: {e!r}") from e
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+        with self._lock:
+            if self._sync_client is not None:
+                self._sync_client.close()
+                self._sync_client = None
+
+
+ollama_client = OllamaClient()
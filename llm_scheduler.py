@@ -0,0 +1,155 @@
+# llm_scheduler.py
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from config import LLM_MAX_CONCURRENCY, LLM_QUEUE_WAIT_WARNING
+from logging_utils import log_message, ConsoleColor
+from metrics import llm_active, llm_queued, llm_queue_wait
+
+# Priority classes, served in this order.
+PRIORITY_INTERACTIVE = 0  # a user is waiting on this exact answer (headlines)
+PRIORITY_MODULE = 1       # single module execution and the book profile it needs
+PRIORITY_BULK = 2         # bulk fills of every module
+PRIORITIES = (PRIORITY_INTERACTIVE, PRIORITY_MODULE, PRIORITY_BULK)
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_MODULE: "module", PRIORITY_BULK: "bulk"}
+
+
+class _Waiter:
+    __slots__ = ("session_id", "priority", "enqueued_at", "event", "future", "loop", "granted")
+
+    def __init__(self, session_id: str, priority: int):
+        self.session_id = session_id
+        self.priority = priority
+        self.enqueued_at = time.monotonic()
+        self.event = None
+        self.future = None
+        self.loop = None
+        self.granted = False
+
+
+class LLMScheduler:
+    """Process-wide cap on concurrent LLM generations, with backpressure.
+
+    Requests above the limit wait in a queue per priority class. Inside a class, sessions
+    are served round-robin so one operator's bulk fill cannot starve the others. Works for
+    coroutines (`slot`) and for worker threads (`slot_sync`) alike. Active and queued counts
+    and queue waits are published to the /metrics gauges and histogram.
+    """
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self._lock = threading.Lock()
+        self._active = 0
+        # priority -> OrderedDict(session_id -> deque of waiters); the dict order is the round-robin order
+        self._queues = {priority: OrderedDict() for priority in PRIORITIES}
+        self._queued = 0
+        self._publish()
+
+    def _publish(self):
+        """Update the scheduler gauges. Called under lock."""
+        llm_active.set(value=self._active)
+        for priority, sessions in self._queues.items():
+            llm_queued.set(PRIORITY_NAMES[priority], value=sum(len(waiters) for waiters in sessions.values()))
+
+    def _try_acquire(self, waiter: _Waiter) -> bool:
+        """Take a slot right away if one is free and nobody is queued, otherwise enqueue. Called under lock."""
+        if self._active < self.max_concurrency and not self._queued:
+            self._active += 1
+            self._record_grant(waiter)
+            self._publish()
+            return True
+        self._queues[waiter.priority].setdefault(waiter.session_id, deque()).append(waiter)
+        self._queued += 1
+        self._publish()
+        return False
+
+    def _record_grant(self, waiter: _Waiter):
+        waiter.granted = True
+        wait = time.monotonic() - waiter.enqueued_at
+        llm_queue_wait.observe(PRIORITY_NAMES[waiter.priority], value=wait)
+        if wait >= LLM_QUEUE_WAIT_WARNING:
+            log_message(f"LLM request waited {wait:.1f}s in queue ({self._queued} still queued).",
+                        level="warning", color=ConsoleColor.YELLOW, session_id=waiter.session_id)
+
+    def _grant_next(self):
+        """Hand free slots to the next waiters. Called under lock."""
+        while self._active < self.max_concurrency and self._queued:
+            sessions = next(q for q in self._queues.values() if q)
+            session_id, waiters = next(iter(sessions.items()))
+            waiter = waiters.popleft()
+            if waiters:
+                sessions.move_to_end(session_id)
+            else:
+                del sessions[session_id]
+            self._queued -= 1
+            self._active += 1
+            self._record_grant(waiter)
+            if waiter.event is not None:
+                waiter.event.set()
+            else:
+                waiter.loop.call_soon_threadsafe(_resolve, waiter.future)
+        self._publish()
+
+    def _dequeue(self, waiter: _Waiter):
+        """Remove a waiter that gave up before being granted. Called under lock."""
+        sessions = self._queues[waiter.priority]
+        waiters = sessions.get(waiter.session_id)
+        if waiters and waiter in waiters:
+            waiters.remove(waiter)
+            self._queued -= 1
+            if not waiters:
+                del sessions[waiter.session_id]
+            self._publish()
+
+    def release(self):
+        with self._lock:
+            self._active -= 1
+            self._grant_next()
+
+    @contextmanager
+    def slot_sync(self, session_id: str = "GLOBAL", priority: int = PRIORITY_MODULE):
+        waiter = _Waiter(session_id, priority)
+        waiter.event = threading.Event()
+        with self._lock:
+            acquired = self._try_acquire(waiter)
+        if not acquired:
+            waiter.event.wait()
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def slot(self, session_id: str = "GLOBAL", priority: int = PRIORITY_MODULE):
+        waiter = _Waiter(session_id, priority)
+        waiter.loop = asyncio.get_running_loop()
+        waiter.future = waiter.loop.create_future()
+        with self._lock:
+            acquired = self._try_acquire(waiter)
+        if not acquired:
+            try:
+                await waiter.future
+            except asyncio.CancelledError:
+                with self._lock:
+                    if waiter.granted:
+                        # Granted while being cancelled: pass the slot on.
+                        self._active -= 1
+                        self._grant_next()
+                    else:
+                        self._dequeue(waiter)
+                raise
+        try:
+            yield
+        finally:
+            self.release()
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+llm_scheduler = LLMScheduler()
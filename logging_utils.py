@@ -1,11 +1,47 @@
 # logging_utils.py
 
+import atexit
+import functools
+import inspect
 import logging
 import logging.config
-from config import LOG_CONFIG
+import logging.handlers
+import queue
+import random
+import threading
+import time
+from config import (LOG_CONFIG, TRACE_ENABLED, TRACE_SAMPLE_RATE, TRACE_MODULE_SAMPLE_RATES,
+                    TRACE_ARG_MAX_CHARS, TRACE_REDACTED_ARGS)
 
-logging.config.dictConfig(LOG_CONFIG)
 logger = logging.getLogger(__name__)
+_configured = False
+_listener = None
+_configure_lock = threading.Lock()
+
+def configure_logging():
+    """Apply LOG_CONFIG; done on the first logged message rather than at import.
+
+    The configured root handlers are moved behind a QueueHandler: callers only enqueue
+    records and a QueueListener thread does the (possibly blocking) writes.
+    """
+    global _configured, _listener
+    if _configured:
+        return
+    # Threads logging their first messages at once must not each start a listener.
+    with _configure_lock:
+        if _configured:
+            return
+        logging.config.dictConfig(LOG_CONFIG)
+        root = logging.getLogger()
+        handlers = root.handlers[:]
+        for handler in handlers:
+            root.removeHandler(handler)
+        records = queue.SimpleQueue()
+        root.addHandler(logging.handlers.QueueHandler(records))
+        _listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+        _configured = True
 
 class ConsoleColor:
     RED = "\033[91m"
@@ -21,6 +57,7 @@ def colored_message(message: str, color: str) -> str:
 def log_message(message: str, level: str = "info", color: str = ConsoleColor.RESET, session_id: str = None):
     if session_id:
         message = f"[Session {session_id}] {message}"
+    configure_logging()
     colored_msg = colored_message(message, color)
     if level.lower() == "info":
         logger.info(colored_msg)
@@ -28,21 +65,76 @@ def log_message(message: str, level: str = "info", color: str = ConsoleColor.RES
         logger.error(colored_msg)
     elif level.lower() == "warning":
         logger.warning(colored_msg)
+    elif level.lower() == "debug":
+        logger.debug(colored_msg)
     else:
         logger.info(colored_msg)
 
-def trace(func):
-    """Decorator to log function entry, exit, and exceptions."""
+def _summarize(value) -> str:
+    text = repr(value)
+    if len(text) <= TRACE_ARG_MAX_CHARS:
+        return text
+    return f"{text[:TRACE_ARG_MAX_CHARS]}… ({len(text)} chars)"
+
+def _summarize_call(signature, args, kwargs) -> str:
+    try:
+        bound = signature.bind_partial(*args, **kwargs).arguments
+    except TypeError:
+        bound = {**{str(position): value for position, value in enumerate(args)}, **kwargs}
+    return ", ".join(f"{name}=***" if name in TRACE_REDACTED_ARGS else f"{name}={_summarize(value)}"
+                     for name, value in bound.items() if name != "self")
+
+def trace(func=None, *, sample_rate: float = None):
+    """Decorator logging the duration of calls, with a short summary of their arguments.
+
+    Works on functions, coroutine functions and classes (their construction is traced).
+    Only a `sample_rate` fraction of the calls is logged, by default the rate configured
+    for the function's module in TRACE_MODULE_SAMPLE_RATES, else TRACE_SAMPLE_RATE;
+    0 turns tracing off. Arguments named in TRACE_REDACTED_ARGS are never logged and the
+    others are truncated; return values are not logged. Failures are always logged.
+    """
+    if func is None:
+        return lambda func: trace(func, sample_rate=sample_rate)
+    if inspect.isclass(func):
+        func.__init__ = trace(func.__init__, sample_rate=sample_rate)
+        return func
+
+    rate = sample_rate if sample_rate is not None else TRACE_MODULE_SAMPLE_RATES.get(func.__module__, TRACE_SAMPLE_RATE)
+    if not TRACE_ENABLED or rate <= 0:
+        return func
+    signature = inspect.signature(func)
+    name = func.__qualname__
+
+    def log_call(started, args, kwargs, error=None):
+        elapsed = (time.perf_counter() - started) * 1000
+        if error is not None:
+            log_message(f"trace {name} failed after {elapsed:.1f}ms ({_summarize_call(signature, args, kwargs)}): "
+                        f"{error!r}", level="error", color=ConsoleColor.RED)
+        elif rate >= 1 or random.random() < rate:
+            log_message(f"trace {name} {elapsed:.1f}ms ({_summarize_call(signature, args, kwargs)})",
+                        color=ConsoleColor.BLUE)
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                log_call(started, args, kwargs, e)
+                raise
+            log_call(started, args, kwargs)
+            return result
+        return async_wrapper
+
+    @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        log_message(f"Entering {func.__name__} with args: {args} kwargs: {kwargs}", 
-                    level="info", color=ConsoleColor.BLUE)
+        started = time.perf_counter()
         try:
             result = func(*args, **kwargs)
-            log_message(f"Exiting {func.__name__} with result: {result}", 
-                        level="info", color=ConsoleColor.GREEN)
-            return result
         except Exception as e:
-            log_message(f"Exception in {func.__name__}: {e}", 
-                        level="error", color=ConsoleColor.RED)
+            log_call(started, args, kwargs, e)
             raise
+        log_call(started, args, kwargs)
+        return result
     return wrapper
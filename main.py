@@ -1,6 +1,5 @@
 # main.py
 from logging_utils import ConsoleColor, log_message
-from wizard.ui_builder import setup_wizard_ui
 
 sovereign_art = """
             ███████╗ ██████╗ ██╗   ██╗███████╗██████╗ ███████╗██╗ ██████╗ ███╗   ██╗
@@ -10,7 +9,10 @@ sovereign_art = """
             ███████║╚██████╔╝╚ ████ ╔╝███████╗██║  ██║███████╗██║╚██████╔╝██║ ╚████║
             ╚══════╝ ╚═════╝  ╚═════╝ ╚══════╝╚═╝  ╚═╝╚══════╝╚═╝ ╚═════╝ ╚═╝  ╚═══╝
 """
-log_message(sovereign_art, color=ConsoleColor.PURPLE)
 
-if __name__ in {"__main__", "__mp_main__"}:
+# Not "__mp_main__": the indexing and parsing worker processes (spawned) import this file
+# under that name, and must not load the UI.
+if __name__ == "__main__":
+    log_message(sovereign_art, color=ConsoleColor.PURPLE)
+    from wizard.ui_builder import setup_wizard_ui
     setup_wizard_ui()
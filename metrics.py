@@ -0,0 +1,128 @@
+# metrics.py
+
+import threading
+import time
+from contextlib import contextmanager
+from config import METRICS_LATENCY_BUCKETS
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_labels(names: tuple, values: tuple, extra: dict = None) -> str:
+    pairs = list(zip(names, values)) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, label_names: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.extend(self._render_sample(labels, value))
+        return lines
+
+    def _render_sample(self, labels: tuple, value) -> list:
+        return [f"{self.name}{_format_labels(self.label_names, labels)} {value}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, *labels, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, *labels, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value: float):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, label_names: tuple = (), buckets: tuple = METRICS_LATENCY_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, *labels, value: float):
+        with self._lock:
+            state = self._values.setdefault(labels, [[0] * len(self.buckets), 0, 0.0])
+            for position, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][position] += 1
+            state[1] += 1
+            state[2] += value
+
+    def _render_sample(self, labels: tuple, state) -> list:
+        bucket_counts, count, total = state
+        lines = [f"{self.name}_bucket{_format_labels(self.label_names, labels, {'le': bound})} {bucket_count}"
+                 for bound, bucket_count in zip(self.buckets, bucket_counts)]
+        lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, {'le': '+Inf'})} {count}")
+        lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {count}")
+        lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {total}")
+        return lines
+
+
+stage_latency = Histogram("aplus_stage_duration_seconds", "Duration of a generation pipeline stage.",
+                          ("stage", "model"))
+stage_calls = Counter("aplus_stage_calls_total", "Pipeline stage executions by outcome.",
+                      ("stage", "model", "outcome"))
+stage_in_flight = Gauge("aplus_stage_in_flight", "Pipeline stage executions currently running.",
+                        ("stage", "model"))
+llm_active = Gauge("aplus_llm_active", "LLM generations holding a scheduler slot.")
+llm_queued = Gauge("aplus_llm_queued", "LLM generations waiting for a scheduler slot, by priority class.",
+                   ("priority",))
+llm_queue_wait = Histogram("aplus_llm_queue_wait_seconds", "Time LLM generations waited for a scheduler slot.",
+                           ("priority",))
+response_cache_lookups = Counter("aplus_response_cache_lookups_total", "LLM response cache lookups by result.",
+                                 ("result",))
+response_cache_hit_rate = Gauge("aplus_response_cache_hit_rate", "Share of LLM response cache lookups that hit.")
+response_cache_bytes = Gauge("aplus_response_cache_bytes", "Size of the cached LLM responses.")
+
+
+@contextmanager
+def track_stage(stage: str, model: str = ""):
+    """Time a pipeline stage into the stage metrics; usable around sync and async code alike."""
+    stage_in_flight.inc(stage, model)
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        stage_in_flight.dec(stage, model)
+        stage_latency.observe(stage, model, value=time.perf_counter() - started)
+        stage_calls.inc(stage, model, outcome)
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in (stage_latency, stage_calls, stage_in_flight, llm_active, llm_queued, llm_queue_wait,
+                   response_cache_lookups, response_cache_hit_rate, response_cache_bytes):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,141 @@
+# module_data.py
+
+import json
+from prompt_builder import BOOK_OF_INTEREST_PLACEHOLDER
+
+# Default A+ module sizes by position; later modules have no default size.
+DEFAULT_MODULE_SIZES = {
+    1: "970x600px Standard Image Header With Text",
+    2: "970x300px Standard Image & Light Text Overlay",
+    3: "4x220x220px Standard Four Images & Text",
+    4: "970x300px Standard Image & Light Text Overlay",
+}
+
+# Nested design attribute groups of the module JSON and the flat value keys they map to.
+DESIGN_ATTRIBUTE_GROUPS = (
+    ("color_palette", "color_", ("primary", "secondary", "accent")),
+    ("fonts", "font_", ("primary", "secondary")),
+    ("image_descriptions", "image_desc_", ("primary", "secondary")),
+)
+
+
+def field_text(value) -> str:
+    """A value of the generated JSON as the text of an input: null becomes empty, lists are comma-joined."""
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        return ", ".join(field_text(item) for item in value)
+    return str(value)
+
+
+def default_module_values(module_id: int) -> dict:
+    """Field values of a freshly added module, using the same keys as `add_module(prefill_data=...)`."""
+    return {
+        "module_id": module_id,
+        "title": "",
+        "headline": "",
+        "subheadline": "",
+        "chosen_mockup_style": "(choose style)",
+        "testimonials": "",
+        "prompt": "Improve this part",
+        "size": DEFAULT_MODULE_SIZES.get(module_id, ""),
+        "color_primary": "#3D5A80",
+        "color_secondary": "#98C1D9",
+        "color_accent": "#EE6C4D",
+        "font_primary": "Roboto",
+        "font_secondary": "Lato",
+        "layout": "Grid-based, two-column layout",
+        "image_desc_primary": "cover shot",
+        "image_desc_secondary": "interior shot",
+        "tags": "C++, Programming",
+        "alignment": "centered",
+    }
+
+
+def module_request_data(values: dict, structure_type: str = None) -> dict:
+    """JSON skeleton sent to the model for one module, filled with the current field values."""
+    return {
+        "structure_type": structure_type,
+        "modules": [
+            {
+                "module_id": values["module_id"],
+                "title": values["title"],
+                "headline": values["headline"],
+                "subheadline": values["subheadline"],
+                "mockup_style": values["chosen_mockup_style"],
+                "testimonials": values["testimonials"],
+                "size": values["size"],
+                "book_of_interest": BOOK_OF_INTEREST_PLACEHOLDER,
+                "design_attributes": {
+                    "color_palette": {
+                        "primary": values["color_primary"],
+                        "secondary": values["color_secondary"],
+                        "accent": values["color_accent"]
+                    },
+                    "fonts": {
+                        "primary": values["font_primary"],
+                        "secondary": values["font_secondary"]
+                    },
+                    "layout": values["layout"],
+                    "image_descriptions": {
+                        "primary": values["image_desc_primary"],
+                        "secondary": values["image_desc_secondary"]
+                    },
+                    "tags": [tag.strip() for tag in values["tags"].split(",")],
+                    "alignment": values["alignment"]
+                }
+            }
+        ]
+    }
+
+
+def parse_module_response(resp_str: str) -> dict:
+    """Field values found in a generated module JSON, keyed like `default_module_values`.
+
+    Raises ValueError (json.JSONDecodeError) or KeyError when the response is not the expected JSON.
+    """
+    data = json.loads(resp_str)
+    mod_data = data["modules"][0]  # assume first module
+    values = {}
+    for key in ("title", "headline", "subheadline", "testimonials", "size"):
+        if key in mod_data:
+            values[key] = field_text(mod_data[key])
+    if "mockup_style" in mod_data:
+        values["chosen_mockup_style"] = field_text(mod_data["mockup_style"])
+
+    da = mod_data.get("design_attributes", {})
+    if isinstance(da, dict):
+        for group, prefix, keys in DESIGN_ATTRIBUTE_GROUPS:
+            attributes = da.get(group, {})
+            for key in keys:
+                if key in attributes:
+                    values[prefix + key] = field_text(attributes[key])
+        if "layout" in da:
+            values["layout"] = field_text(da["layout"])
+        if "tags" in da and isinstance(da["tags"], list):
+            values["tags"] = field_text(da["tags"])
+        if "alignment" in da:
+            values["alignment"] = field_text(da["alignment"])
+    return values
+
+
+def changed_module_values(current: dict, values: dict) -> dict:
+    """The entries of `values` that differ from `current`, i.e. the fields a module fill has to update."""
+    return {key: value for key, value in values.items() if current.get(key) != value}
+
+
+def plan_entry(values: dict) -> dict:
+    """Summary of one module in the final plan."""
+    return {
+        "module_title": values["title"],
+        "headline": values["headline"],
+        "subheadline": values["subheadline"],
+        "mockup_style": values["chosen_mockup_style"],
+        "testimonials": values["testimonials"],
+        "prompt": values["prompt"],
+        "size": values["size"],
+    }
+
+
+def format_plan(entries: list) -> str:
+    return f"Plan created with {len(entries)} modules:\n" + "\n".join(str(entry) for entry in entries)
@@ -0,0 +1,147 @@
+# ollama_embedding.py
+
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List
+import httpx
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+from config import (OLLAMA_EMBED_MODEL, EMBED_REQUEST_BATCH_SIZE, EMBED_CONCURRENCY, EMBEDDING_CACHE_PATH,
+                    OLLAMA_CONNECT_TIMEOUT, OLLAMA_READ_TIMEOUT, OLLAMA_KEEP_ALIVE)
+from llm_client import OLLAMA_API_URL, OllamaError
+from metrics import track_stage
+
+
+def embedding_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """On-disk cache of chunk embeddings keyed by model and text, shared by the indexing processes.
+
+    Vectors are stored as raw float32 bytes. The database is opened on first use.
+    """
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+            self._conn = conn
+        return self._conn
+
+    def get_many(self, keys: list) -> dict:
+        found = {}
+        with self._lock:
+            conn = self._connection()
+            # Stay well below SQLite's limit on bound parameters.
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                for key, vector in conn.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                                                batch):
+                    found[key] = np.frombuffer(vector, dtype=np.float32).tolist()
+        return found
+
+    def put_many(self, items: dict):
+        with self._lock:
+            conn = self._connection()
+            conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                             [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items.items()])
+
+
+class OllamaBatchEmbedding(BaseEmbedding):
+    """Embeddings from the local Ollama `/api/embed` endpoint.
+
+    Texts already embedded with the same model are served from `EmbeddingCache`; the
+    others are sent in requests of `request_batch_size` texts, up to `concurrency` at once.
+    """
+
+    base_url: str = OLLAMA_API_URL
+    request_batch_size: int = EMBED_REQUEST_BATCH_SIZE
+    concurrency: int = EMBED_CONCURRENCY
+
+    _client: httpx.Client = PrivateAttr(default=None)
+    _cache: EmbeddingCache = PrivateAttr(default=None)
+    _lock: Any = PrivateAttr(default=None)
+
+    def __init__(self, model_name: str = OLLAMA_EMBED_MODEL, cache: EmbeddingCache = None, **kwargs: Any):
+        # llama_index hands over at most embed_batch_size texts per call; let it pass whole
+        # documents and split them into requests here.
+        kwargs.setdefault("embed_batch_size", 2048)
+        super().__init__(model_name=model_name, **kwargs)
+        self._cache = cache or EmbeddingCache()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "OllamaBatchEmbedding"
+
+    def _get_client(self) -> httpx.Client:
+        with self._lock:
+            if self._client is None:
+                self._client = httpx.Client(base_url=self.base_url.rstrip("/"),
+                                            timeout=httpx.Timeout(OLLAMA_READ_TIMEOUT, connect=OLLAMA_CONNECT_TIMEOUT),
+                                            limits=httpx.Limits(max_connections=self.concurrency))
+            return self._client
+
+    def _request(self, texts: list) -> list:
+        payload = {"model": self.model_name, "input": texts, "keep_alive": OLLAMA_KEEP_ALIVE}
+        with track_stage("embedding_request", self.model_name):
+            try:
+                response = self._get_client().post("/api/embed", json=payload)
+            except httpx.HTTPError as e:
+                raise OllamaError(f"Error with Ollama embeddings API: {e!r}") from e
+            if response.status_code != 200:
+                raise OllamaError(f"Error with Ollama embeddings API: {response.status_code} {response.text}")
+        embeddings = response.json().get("embeddings", [])
+        if len(embeddings) != len(texts):
+            raise OllamaError(f"Ollama returned {len(embeddings)} embeddings for {len(texts)} texts.")
+        return embeddings
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        keys = [embedding_key(self.model_name, text) for text in texts]
+        known = self._cache.get_many(keys)
+        # Identical chunks within the call are embedded once.
+        missing = list(dict.fromkeys(key for key in keys if key not in known))
+        if missing:
+            texts_by_key = dict(zip(keys, texts))
+            batches = [missing[start:start + self.request_batch_size]
+                       for start in range(0, len(missing), self.request_batch_size)]
+            with ThreadPoolExecutor(max_workers=min(self.concurrency, len(batches))) as executor:
+                results = executor.map(lambda batch: self._request([texts_by_key[key] for key in batch]), batches)
+                computed = {}
+                for batch, embeddings in zip(batches, results):
+                    computed.update(zip(batch, embeddings))
+            self._cache.put_many(computed)
+            known.update(computed)
+        return [known[key] for key in keys]
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embeddings([text])[0]
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._get_text_embeddings([query])[0]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return await asyncio.to_thread(self._get_query_embedding, query)
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return await asyncio.to_thread(self._get_text_embedding, text)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.to_thread(self._get_text_embeddings, texts)
+
+
+ollama_embedding = OllamaBatchEmbedding()
@@ -1,16 +1,20 @@
-import os
+import asyncio
 import re
-import requests
 from nicegui import ui
+from config import WIZARD_MAX_CONCURRENT_GENERATIONS
+from llm_client import ollama_client, OllamaError
+from llm_scheduler import PRIORITY_MODULE
 from logging_utils import log_message, ConsoleColor, trace
-
-OLLAMA_API_URL = os.environ.get("OLLAMA_API_URL", "http://ollama:11434/v1/llama")
+from metrics import track_stage
 
 OLLAMA_API_KEY_REGEX = r'^sk(?:-proj)?-[A-Za-z0-9_-]+$'
 
 class OpenAIClient:
-    def __init__(self):
+    """Model client of one wizard session, running at most `max_concurrent_generations` calls at once."""
+
+    def __init__(self, max_concurrent_generations: int = WIZARD_MAX_CONCURRENT_GENERATIONS):
         self.api_key = None
+        self._generations = asyncio.Semaphore(max_concurrent_generations)
 
     def set_api_key(self, key: str):
         """Set the Ollama API key with regex validation."""
@@ -25,19 +29,39 @@ class OpenAIClient:
             log_message(f"Error in set_api_key: {e}", level="error", session_id="GLOBAL")
             ui.notify("Failed to set API key.", color="red", position="top")
 
-    def get_response(prompt: str) -> str:
+    async def get_response(self, prompt: str, max_tokens: int = None,
+                           session_id: str = "GLOBAL", priority: int = PRIORITY_MODULE,
+                           regenerate: bool = False, module_id=None, prefix: str = None) -> str:
         """Appeler l'API Ollama pour obtenir une réponse à partir du prompt."""
         try:
-            headers = {'Content-Type': 'application/json'}
-            payload = {'prompt': prompt, 'model': 'llama2'}
+            async with self._generations:
+                with track_stage("module_call", ollama_client.model):
+                    response = await ollama_client.generate(prompt, max_tokens=max_tokens, session_id=session_id,
+                                                            priority=priority, regenerate=regenerate,
+                                                            module_id=module_id, prefix=prefix)
+            return response.strip()
+        except OllamaError as e:
+            log_message(f"Erreur de l'API Ollama : {e}", level="error", color=ConsoleColor.RED)
+            return ""
+        except Exception as e:
+            log_message(f"Erreur lors de l'appel à l'API Ollama : {e}", level="error", color=ConsoleColor.RED)
+            return ""
 
-            response = requests.post(OLLAMA_API_URL, json=payload, headers=headers)
+    async def stream_response(self, prompt: str, max_tokens: int = None,
+                              session_id: str = "GLOBAL", priority: int = PRIORITY_MODULE,
+                              regenerate: bool = False, module_id=None, prefix: str = None):
+        """Yield the response to the prompt token by token; stops early on API errors.
 
-            if response.status_code == 200:
-                return response.json().get('response', '').strip()
-            else:
-                print(f"Erreur de l'API Ollama : {response.status_code}")
-                return ""
+        `prefix` is the part of the prompt shared with other calls, see `OllamaClient`.
+        """
+        try:
+            async with self._generations:
+                with track_stage("module_stream", ollama_client.model):
+                    async for token in ollama_client.stream(prompt, max_tokens=max_tokens, session_id=session_id,
+                                                            priority=priority, regenerate=regenerate,
+                                                            module_id=module_id, prefix=prefix):
+                        yield token
+        except OllamaError as e:
+            log_message(f"Erreur de l'API Ollama : {e}", level="error", color=ConsoleColor.RED)
         except Exception as e:
-            print(f"Erreur lors de l'appel à l'API Ollama : {e}")
-            return ""
\ No newline at end of file
+            log_message(f"Erreur lors de l'appel à l'API Ollama : {e}", level="error", color=ConsoleColor.RED)
@@ -0,0 +1,90 @@
+# prompt_builder.py
+
+import json
+
+# Static part of every module prompt. It is kept byte-identical across modules and
+# books so that it always forms the start of the prompt.
+MODULE_INSTRUCTIONS = """\
+Take a deep breath and generate only one comprehensive module description for a book of interest. ACT as a holywood movie poster creator
+that is preparing a book marketing campaign in strict JSON format, incorporating all provided details exactly as given.
+<Requirements>
+Golden Rule:
+Treat the book as more than just pages with words—it's a gateway to an experience. Every element of the campaign should convey the journey the reader will embark upon.
+Understand the Book's Core Essence
+    Read or thoroughly research the book to grasp its central theme, narrative, and value proposition.
+    Identify the core message and the author's intent—what transformation does the reader experience after engaging with this book?
+    Summarize the book in one compelling sentence to clarify its essence for the campaign.
+Define the Target Audience with Precision
+    Identify the book's primary and secondary audiences based on genre, themes, and style.
+    Build audience personas that detail demographics, motivations, and reading behaviors.
+    Understand emotional drivers: What does the audience seek—entertainment, education, inspiration, or transformation?
+Craft Messaging that Resonates
+    Develop a clear value proposition: Why should someone read this book over others in the same genre?
+    Craft headlines that evoke curiosity and emotion. Lead with the book's most intriguing aspect or boldest claim.
+    Ensure subheadlines provide clarity, context, and compelling reasons to continue reading.
+    Avoid generic language like “must-read” or “unputdownable.” Instead, focus on the book's unique impact on the reader's life.
+Visual Storytelling and Branding
+    Identify visual themes that align with the book's genre and mood (e.g., soft pastels for romance, bold contrasts for thrillers, minimalism for non-fiction).
+    Create mood boards that capture the book's essence—characters, settings, and core ideas should be visually represented.
+    Choose color schemes that evoke the desired emotional response: warm tones for comfort, cool tones for intellectual themes, vibrant accents for excitement.
+    Ensure all visual materials maintain a consistent style across platforms to reinforce brand recognition.
+Master Tone and Voice
+    Adjust the tone to suit the genre:
+        Fiction: Imaginative, emotionally evocative.
+        Non-fiction: Authoritative yet relatable.
+        Self-help: Motivational and solution-oriented.
+        Memoir: Authentic and deeply personal.
+    Develop brand guidelines that define the campaign's voice, ensuring consistency across all materials.
+<Good Example>
+"structure_type": "Module",
+"modules":
+    "title": "The Society of Mind: Exploring the Architecture of Thought",
+    "headline": "Embark on a Journey into the Mind's Inner Workings",
+    "subheadline": "Marvin Minsky unveils a groundbreaking perspective on how simple components collaborate to create the tapestry of human thought.",
+    "mockup_style": "Open Book Display",
+    "testimonials": "A profound and fascinating book that lays down the foundations for the solution of one of the last great problems of modern science.",
+    "size": "970x600px Standard Image Header with Text",
+    "book_of_interest": "The Society of Mind by Marvin Minsky",
+    "design_attributes":
+        "color_palette":
+        "primary": "#2C3E50",
+        "secondary": "#8E44AD",
+        "accent": "#3498DB",
+        "fonts":
+        "primary": "Arial",
+        "secondary": "Times New Roman",
+        "layout": "Balanced, single-column layout",
+        "image_descriptions":
+        "primary": "Cover art depicting a stylized sphere composed of interlocking geometric shapes, symbolizing the complexity and unity of the mind.",
+        "secondary": "Interior illustrations featuring interconnected diagrams and conceptual imagery that bring the book's theories to life.",
+        "tags":
+        "cognitive science",
+        "artificial intelligence",
+        "Marvin Minsky",
+        "human cognition",
+        "alignment": "centered"
+<Bad Example>
+Visual: A 3D mockup of the book cover.
+Headline: A vague, clichéd headline with overused phrases.
+Example: "Delve into the world of endless possibilities and unleash the power of transformation."
+Subheadline: A generic subheadline that fails to highlight specific benefits.
+Example: "Learn everything you need to know about success and growth."
+"""
+
+OUTPUT_INSTRUCTION = "[TARGET] ALWAYS Strictly output a JSON containing all necessary information like so:"
+BOOK_OF_INTEREST_PLACEHOLDER = "<title and author of the book of interest, from the Book profile above>"
+
+
+def build_module_prefix(book_context: str) -> str:
+    """Shared prompt prefix for every module of a book: static instructions, then the book profile."""
+    return f"{MODULE_INSTRUCTIONS}\n<Book profile>\n{book_context}\n</Book profile>\n"
+
+
+def build_module_suffix(final_data: dict) -> str:
+    """Per-module part of the prompt, always placed after the shared prefix."""
+    return f"{OUTPUT_INSTRUCTION}\n{json.dumps(final_data, indent=2)}\n"
+
+
+def build_module_prompt(book_context: str, final_data: dict) -> tuple:
+    """Return the (prefix, suffix) pair of a module prompt."""
+    return build_module_prefix(book_context), build_module_suffix(final_data)
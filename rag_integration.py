@@ -1,8 +1,11 @@
-import json
 import os
-import requests
-from llama_index.core import VectorStoreIndex, SimpleDirectoryReader, StorageContext, load_index_from_storage
+from book_profile import get_book_profile, format_profile
+from config import OLLAMA_MODEL
+from index_registry import index_registry, selection_fingerprint, selection_key
+from llm_client import ollama_client
 from logging_utils import log_message, ConsoleColor
+from metrics import track_stage
+from singleflight import SingleFlight
 
 A1 = {
   "questions": [
@@ -24,50 +27,59 @@ A1 = {
   ]
 }
 
-def query_ollama(prompt: str, api_key: str) -> str:
-    url = "http://ollama:11434/v1/generate"
-    headers = {
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "input": prompt,
-        "model": "llama2"
-    }
-    
-    response = requests.post(url, json=payload, headers=headers)
-    
-    if response.status_code == 200:
-        return response.json()["response"]
-    else:
-        raise ValueError(f"Error with Ollama API: {response.text}")
+_rag_runs = SingleFlight()
+
+def _noop_progress(message: str, fraction: float = None):
+    pass
+
+def query_ollama(prompt: str, api_key: str, session_id: str = "GLOBAL", regenerate: bool = False) -> str:
+    # Blocking on purpose: called from worker threads (executor, book profile pool).
+    with track_stage("book_summary_call", OLLAMA_MODEL):
+        return ollama_client.generate_sync(prompt, session_id=session_id, regenerate=regenerate,
+                                           module_id="book_profile")
 
 def run_rag_system(
     api_key: str,
     persist_dir: str,
-    data_dir: str,
+    data_dir,
+    session_id: str = "GLOBAL",
+    progress=_noop_progress,
 ) -> str:
-    try:
-        storage_context = StorageContext.from_defaults(persist_dir=persist_dir)
-        index = load_index_from_storage(storage_context)
-        log_message("✅ Index loaded from disk.", color=ConsoleColor.GREEN)
-    except FileNotFoundError:
-        if not os.path.isdir(data_dir) or not os.listdir(data_dir):
-            raise ValueError(f"🚨 No documents found in '{data_dir}'. Please add files to index.")
-        documents = SimpleDirectoryReader(data_dir).load_data()
-        index = VectorStoreIndex.from_documents(documents)
-        index.storage_context.persist(persist_dir=persist_dir)
-        log_message("✅ Index created and persisted to disk.", color=ConsoleColor.GREEN)
+    """Return the book profile of `data_dir`, building its index if needed.
+
+    `data_dir` is a corpus directory or a list of them (the subfolders selected in
+    Step 1). Each corpus has its own persisted index and only those indexes are queried.
+
+    Concurrent calls for the same corpus (e.g. several module cards executed together)
+    share one run instead of each loading the index and generating the profile.
+    `progress(message, fraction)` is called from the worker thread as the run advances.
+
+    Raises OllamaError (a ValueError) when the profile cannot be generated, so callers do
+    not mistake the error for the profile.
+    """
+    data_dirs = [data_dir] if isinstance(data_dir, str) else list(data_dir)
+    key = (os.path.realpath(persist_dir), selection_key(data_dirs))
+    return _rag_runs.do(key, lambda: _run_rag_system(api_key, persist_dir, data_dirs, session_id, progress))
+
+def _run_rag_system(api_key: str, persist_dir: str, data_dirs: list, session_id: str, progress) -> str:
+    with track_stage("index_load"):
+        indexes = index_registry.get_indexes(data_dirs, persist_dir, progress)
 
-    summary_query = ("Provide a concise summary of the key themes and content of this book. "
-                     "Consider foundational assumptions, core elements, evident patterns, long-term implications, "
-                     "and key stakeholders from the provided data: "
-                     f"{json.dumps(A1)}")
-    
     try:
-        book_summary = query_ollama(summary_query, api_key)
-        log_message("✅ RAG system completed. Returning final improved response.", color=ConsoleColor.GREEN)
+        with track_stage("book_profile", OLLAMA_MODEL):
+            profile = get_book_profile(
+                indexes,
+                persist_dir=os.path.join(persist_dir, selection_key(data_dirs)),
+                fingerprint=selection_fingerprint(data_dirs),
+                questions=A1["questions"],
+                generate=lambda prompt: query_ollama(prompt, api_key, session_id=session_id),
+                model=OLLAMA_MODEL,
+                progress=progress,
+            )
+        book_summary = format_profile(profile)
+        log_message("✅ RAG system completed. Returning book profile.", color=ConsoleColor.GREEN)
     except ValueError as e:
         log_message(f"❌ Error in querying Ollama: {str(e)}", color=ConsoleColor.RED)
-        return str(e)
-    
+        raise
+
     return book_summary
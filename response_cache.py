@@ -0,0 +1,118 @@
+# response_cache.py
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from config import RESPONSE_CACHE_PATH, RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_TTL
+from logging_utils import log_message, ConsoleColor
+from metrics import response_cache_lookups, response_cache_hit_rate, response_cache_bytes
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace so that re-indented but identical prompts share an entry."""
+    return " ".join(prompt.split())
+
+
+def make_key(model: str, prompt: str, params: dict) -> str:
+    payload = json.dumps([model, normalize_prompt(prompt), params], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """On-disk cache of LLM responses, bounded in size (LRU) with an optional TTL.
+
+    Backed by SQLite so that it survives restarts and is shared by worker threads.
+    The database is opened on first use. Its total size is kept as a running count,
+    summed again from the table only when it grows over the limit (other processes
+    sharing the file may have evicted entries meanwhile).
+    """
+
+    def __init__(self, path: str = RESPONSE_CACHE_PATH, max_bytes: int = RESPONSE_CACHE_MAX_BYTES,
+                 ttl: float = RESPONSE_CACHE_TTL):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._total_bytes = 0
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS responses ("
+                         "key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL, "
+                         "created_at REAL NOT NULL, accessed_at REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+            self._conn = conn
+            self._total_bytes = self._sum_sizes(conn)
+        return self._conn
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT response, created_at, size FROM responses WHERE key = ?", (key,)).fetchone()
+            if row and self.ttl is not None and now - row[1] > self.ttl:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._total_bytes -= row[2]
+                row = None
+            if row is None:
+                self.misses += 1
+                self._record_lookup("miss")
+                return None
+            conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            self._record_lookup("hit")
+            return row[0]
+
+    def put(self, key: str, response: str):
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            conn = self._connection()
+            replaced = conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            conn.execute("INSERT OR REPLACE INTO responses (key, response, size, created_at, accessed_at) "
+                         "VALUES (?, ?, ?, ?, ?)", (key, response, size, now, now))
+            self._total_bytes += size - (replaced[0] if replaced else 0)
+            self._evict(conn)
+            response_cache_bytes.set(value=self._total_bytes)
+
+    def _evict(self, conn: sqlite3.Connection):
+        if self._total_bytes <= self.max_bytes:
+            return
+        self._total_bytes = self._sum_sizes(conn)
+        if self._total_bytes <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall():
+            if self._total_bytes <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._total_bytes -= size
+            evicted += 1
+        log_message(f"LLM response cache: evicted {evicted} entries.", color=ConsoleColor.YELLOW)
+
+    @staticmethod
+    def _sum_sizes(conn: sqlite3.Connection) -> int:
+        return conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def _record_lookup(self, result: str):
+        response_cache_lookups.inc(result)
+        response_cache_hit_rate.set(value=self.stats()["hit_rate"])
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+response_cache = ResponseCache()
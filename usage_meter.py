@@ -0,0 +1,86 @@
+# usage_meter.py
+
+import threading
+from dataclasses import dataclass
+from config import GPT4_INPUT_PRICE_PER_1000, GPT4_OUTPUT_PRICE_PER_1000
+from logging_utils import log_message, ConsoleColor
+
+_encoding = None
+_encoding_unavailable = False
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens with tiktoken, or estimate them when its encoding cannot be loaded (offline)."""
+    global _encoding, _encoding_unavailable
+    if _encoding is None and not _encoding_unavailable:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            _encoding_unavailable = True
+            log_message(f"tiktoken unavailable, estimating token counts: {e}", level="warning",
+                        color=ConsoleColor.YELLOW)
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return max(1, len(text) // 4) if text else 0
+
+
+@dataclass
+class UsageTotals:
+    calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    wall_time: float = 0.0
+
+    @property
+    def tokens_per_second(self) -> float:
+        return self.completion_tokens / self.wall_time if self.wall_time else 0.0
+
+    @property
+    def cost(self) -> float:
+        return (self.prompt_tokens * GPT4_INPUT_PRICE_PER_1000
+                + self.completion_tokens * GPT4_OUTPUT_PRICE_PER_1000) / 1000
+
+    def add(self, other: "UsageTotals"):
+        self.calls += other.calls
+        self.prompt_tokens += other.prompt_tokens
+        self.completion_tokens += other.completion_tokens
+        self.wall_time += other.wall_time
+
+    def summary(self) -> str:
+        return (f"{self.calls} call(s), {self.prompt_tokens} prompt + {self.completion_tokens} completion tokens, "
+                f"{self.wall_time:.1f}s, {self.tokens_per_second:.1f} tok/s, ~${self.cost:.4f}")
+
+
+class UsageMeter:
+    """Token, latency and estimated cost of LLM calls, aggregated per session and per module."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions = {}  # session_id -> UsageTotals
+        self._modules = {}   # (session_id, module_id) -> UsageTotals
+
+    def record(self, session_id: str, module_id, prompt_tokens: int, completion_tokens: int,
+               wall_time: float) -> UsageTotals:
+        usage = UsageTotals(1, prompt_tokens, completion_tokens, wall_time)
+        with self._lock:
+            self._sessions.setdefault(session_id, UsageTotals()).add(usage)
+            if module_id is not None:
+                self._modules.setdefault((session_id, module_id), UsageTotals()).add(usage)
+        log_message(f"LLM usage [{module_id or '-'}]: {usage.summary()}", session_id=session_id)
+        return usage
+
+    def session_totals(self, session_id: str) -> UsageTotals:
+        with self._lock:
+            totals = UsageTotals()
+            totals.add(self._sessions.get(session_id, UsageTotals()))
+            return totals
+
+    def module_totals(self, session_id: str, module_id) -> UsageTotals:
+        with self._lock:
+            totals = UsageTotals()
+            totals.add(self._modules.get((session_id, module_id), UsageTotals()))
+            return totals
+
+
+usage_meter = UsageMeter()
@@ -0,0 +1,165 @@
+# vector_store.py
+
+import json
+import os
+from typing import Any, List
+import numpy as np
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    VectorStoreQuery,
+    VectorStoreQueryMode,
+    VectorStoreQueryResult,
+)
+
+VECTORS_FILE = "vectors.npy"
+VECTOR_IDS_FILE = "vector_ids.json"
+
+
+def _normalize(rows: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(rows, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return rows / norms
+
+
+def top_k_rows(matrix: np.ndarray, queries: np.ndarray, top_k: int) -> tuple:
+    """Positions and cosine scores of the `top_k` rows of `matrix` closest to each query, best first.
+
+    `matrix` rows must be normalized. All queries are scored with a single matrix multiply and
+    only the k best candidates of each are sorted. Returns two (queries, k) arrays.
+    """
+    scores = _normalize(np.asarray(queries, dtype=np.float32)) @ matrix.T
+    top_k = min(top_k, scores.shape[1])
+    if top_k == 0:
+        return np.empty((len(scores), 0), dtype=np.int64), np.empty((len(scores), 0), dtype=np.float32)
+    if top_k < scores.shape[1]:
+        candidates = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+    else:
+        candidates = np.tile(np.arange(scores.shape[1]), (len(scores), 1))
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1)
+    return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(candidate_scores, order, axis=1)
+
+
+class MmapVectorStore(BasePydanticVectorStore):
+    """Vector store keeping the embeddings of an index as one float32 matrix of normalized rows.
+
+    It is persisted as a .npy file, memory-mapped read-only on load so that loading is
+    immediate and the pages are shared by every process reading the same index, plus a
+    small JSON table of node ids. Text and metadata stay in the docstore.
+    """
+
+    stores_text: bool = False
+
+    _matrix: np.ndarray = PrivateAttr()
+    _node_ids: list = PrivateAttr()
+    _ref_doc_ids: list = PrivateAttr()
+    _pending: list = PrivateAttr()
+
+    def __init__(self, matrix: np.ndarray = None, node_ids: list = None, ref_doc_ids: list = None, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._matrix = matrix
+        self._node_ids = node_ids or []
+        self._ref_doc_ids = ref_doc_ids or []
+        self._pending = []
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "MmapVectorStore"
+
+    @property
+    def client(self) -> None:
+        return None
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir: str) -> "MmapVectorStore":
+        """Open the store persisted in `persist_dir`; raises FileNotFoundError if there is none."""
+        with open(os.path.join(persist_dir, VECTOR_IDS_FILE), "r", encoding="utf-8") as f:
+            table = json.load(f)
+        matrix = np.load(os.path.join(persist_dir, VECTORS_FILE), mmap_mode="r") if table["node_ids"] else None
+        return cls(matrix=matrix, node_ids=table["node_ids"], ref_doc_ids=table["ref_doc_ids"])
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """All embeddings as a (nodes, dimensions) float32 matrix, rows in `node_ids` order."""
+        if self._pending:
+            rows = _normalize(np.asarray(self._pending, dtype=np.float32))
+            self._matrix = rows if self._matrix is None else np.concatenate([self._matrix, rows])
+            self._pending = []
+        return self._matrix
+
+    @property
+    def node_ids(self) -> list:
+        return self._node_ids
+
+    def add(self, nodes: List[BaseNode], **add_kwargs: Any) -> List[str]:
+        for node in nodes:
+            self._pending.append(node.get_embedding())
+            self._node_ids.append(node.node_id)
+            self._ref_doc_ids.append(node.ref_doc_id)
+        return [node.node_id for node in nodes]
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        keep = [position for position, doc_id in enumerate(self._ref_doc_ids) if doc_id != ref_doc_id]
+        if len(keep) == len(self._ref_doc_ids):
+            return
+        matrix = self.matrix
+        # Fancy indexing copies, so a memory-mapped matrix is never written through.
+        self._matrix = matrix[keep] if keep else None
+        self._node_ids = [self._node_ids[position] for position in keep]
+        self._ref_doc_ids = [self._ref_doc_ids[position] for position in keep]
+
+    def clear(self) -> None:
+        self._matrix = None
+        self._node_ids, self._ref_doc_ids, self._pending = [], [], []
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        if query.mode != VectorStoreQueryMode.DEFAULT:
+            raise ValueError(f"Unsupported query mode: {query.mode}")
+        if query.filters is not None:
+            raise ValueError("Metadata filters are not supported by this vector store.")
+        if query.node_ids is None:
+            return self.query_batch([query.query_embedding], query.similarity_top_k)[0]
+
+        matrix = self.matrix
+        allowed = set(query.node_ids)
+        candidates = np.array([position for position, node_id in enumerate(self._node_ids)
+                               if node_id in allowed], dtype=np.int64)
+        if matrix is None or len(candidates) == 0:
+            return VectorStoreQueryResult(similarities=[], ids=[])
+        positions, scores = top_k_rows(matrix[candidates], [query.query_embedding], query.similarity_top_k)
+        return VectorStoreQueryResult(
+            similarities=scores[0].tolist(),
+            ids=[self._node_ids[position] for position in candidates[positions[0]]],
+        )
+
+    def query_batch(self, query_embeddings: list, top_k: int) -> List[VectorStoreQueryResult]:
+        """Answer several queries at once, one result per query embedding."""
+        matrix = self.matrix
+        if matrix is None:
+            return [VectorStoreQueryResult(similarities=[], ids=[]) for _ in query_embeddings]
+        positions, scores = top_k_rows(matrix, query_embeddings, top_k)
+        return [
+            VectorStoreQueryResult(similarities=row_scores.tolist(),
+                                   ids=[self._node_ids[position] for position in row_positions])
+            for row_positions, row_scores in zip(positions, scores)
+        ]
+
+    def persist(self, persist_path: str, fs=None) -> None:
+        """Write the matrix and id table next to `persist_path`, replacing the previous files atomically.
+
+        Readers that memory-mapped the previous file keep their (unlinked) copy.
+        """
+        persist_dir = os.path.dirname(persist_path)
+        os.makedirs(persist_dir, exist_ok=True)
+        matrix = self.matrix
+        if matrix is not None:
+            tmp_path = os.path.join(persist_dir, f".{VECTORS_FILE}.tmp")
+            with open(tmp_path, "wb") as f:
+                np.save(f, np.ascontiguousarray(matrix, dtype=np.float32))
+            os.replace(tmp_path, os.path.join(persist_dir, VECTORS_FILE))
+        tmp_path = os.path.join(persist_dir, f".{VECTOR_IDS_FILE}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"node_ids": self._node_ids, "ref_doc_ids": self._ref_doc_ids}, f)
+        os.replace(tmp_path, os.path.join(persist_dir, VECTOR_IDS_FILE))
@@ -0,0 +1,92 @@
+# wizard/prewarm.py
+
+import asyncio
+from nicegui import ui
+from config import INDEX_PERSIST_ROOT
+from file_manager import selected_data_dirs
+from logging_utils import log_message, ConsoleColor
+
+
+class PrewarmJob:
+    """Background build of a book's index and profile, started as soon as Step 1 is validated."""
+
+    def __init__(self, data_dirs: list):
+        self.data_dirs = data_dirs
+        self.future = None
+        # Written by the worker thread, read by the UI timer.
+        self.message = "Preparing book..."
+        self.fraction = None
+
+    def report(self, message: str, fraction: float = None):
+        self.message = message
+        self.fraction = fraction
+
+    @property
+    def failed(self) -> bool:
+        return self.future.done() and (self.future.cancelled() or self.future.exception() is not None)
+
+
+def start_prewarm(wizard) -> PrewarmJob:
+    """Start (or reuse) the background job preparing the folders selected in Step 1."""
+    data_dirs = selected_data_dirs(wizard)
+    job = wizard.prewarm_job
+    if job and job.data_dirs == data_dirs and not job.failed:
+        return job
+
+    job = PrewarmJob(data_dirs)
+    api_key = wizard.openai_client.api_key
+    loop = asyncio.get_running_loop()
+    job.future = loop.run_in_executor(
+        None,
+        lambda: _prepare_book(api_key, data_dirs, wizard.session_id, job.report)
+    )
+    job.future.add_done_callback(lambda _: _on_done(wizard, job))
+    wizard.prewarm_job = job
+    log_message(f"Book preparation started for {data_dirs}.", session_id=wizard.session_id)
+    return job
+
+
+def _prepare_book(api_key: str, data_dirs: list, session_id: str, progress) -> str:
+    # Imported in the worker thread: llama_index is not needed to serve the UI and takes
+    # over a second to load.
+    from rag_integration import run_rag_system
+    return run_rag_system(api_key=api_key, persist_dir=INDEX_PERSIST_ROOT, data_dir=data_dirs,
+                          session_id=session_id, progress=progress)
+
+
+def _on_done(wizard, job: PrewarmJob):
+    if job.future.cancelled():
+        job.report("Book preparation cancelled.", None)
+    elif job.failed:
+        job.report(f"Book preparation failed: {job.future.exception()}", None)
+        log_message(job.message, level="error", color=ConsoleColor.RED, session_id=wizard.session_id)
+    else:
+        job.report("Book ready.", 1.0)
+        log_message("Book preparation finished.", color=ConsoleColor.GREEN, session_id=wizard.session_id)
+
+
+async def get_book_context(wizard) -> str:
+    """Await the book profile of the selected book, joining the background job when it is running."""
+    job = start_prewarm(wizard)
+    # Shielded: a module giving up must not cancel the job the other modules wait on.
+    return await asyncio.shield(job.future)
+
+
+def build_prewarm_status(wizard):
+    """Progress row showing the state of the background book preparation."""
+    with ui.row().classes("items-center gap-4 w-full") as row:
+        label = ui.label("").classes("text-body2")
+        bar = ui.linear_progress(value=0, show_value=False).classes("w-64")
+    row.set_visibility(False)
+
+    def refresh():
+        job = wizard.prewarm_job
+        if job is None:
+            return
+        row.set_visibility(True)
+        label.set_text(job.message)
+        if job.fraction is not None:
+            bar.set_value(job.fraction)
+
+    ui.timer(0.5, refresh)
+    return row
@@ -0,0 +1,216 @@
+# wizard/session_state.py
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pydantic import BaseModel, Field, field_validator
+from config import SESSION_STORE_PATH, SESSION_STORE_FLUSH_INTERVAL, SESSION_STORE_TTL
+from logging_utils import log_message, ConsoleColor
+from module_data import field_text
+
+
+class ModuleState(BaseModel):
+    """Field values of one module, keyed like `add_module(prefill_data=...)` (see module_data.default_module_values)."""
+    module_id: int
+    title: str
+    headline: str
+    subheadline: str
+    chosen_mockup_style: str
+    testimonials: str
+    prompt: str
+    size: str
+    color_primary: str
+    color_secondary: str
+    color_accent: str
+    font_primary: str
+    font_secondary: str
+    layout: str
+    image_desc_primary: str
+    image_desc_secondary: str
+    tags: str
+    alignment: str
+
+    # Inputs may hold whatever the model returned (null, lists): store it as the text shown.
+    @field_validator("*", mode="before")
+    @classmethod
+    def _as_text(cls, value, info):
+        return value if info.field_name == "module_id" else field_text(value)
+
+
+class BonusModuleState(BaseModel):
+    title: str = ""
+    description: str = ""
+    prompt: str = ""
+
+    @field_validator("*", mode="before")
+    @classmethod
+    def _as_text(cls, value):
+        return field_text(value)
+
+
+class SessionState(BaseModel):
+    """Everything needed to rebuild a wizard page, without any widget reference.
+
+    The API key is deliberately left out: it is asked again after a restore.
+    """
+    session_id: str
+    step: str = ""  # Name of the current stepper step
+    root_directory: str = ""
+    subfolders: list[str] = Field(default_factory=list)  # Ticked subfolders of root_directory
+    book_type: str | None = None
+    structure_type: str | None = None
+    modules: list[ModuleState] = Field(default_factory=list)
+    deleted_modules: list[ModuleState] = Field(default_factory=list)  # Undo history, oldest first
+    bonus_modules: list[BonusModuleState] = Field(default_factory=list)
+    proposed_headlines: list[str] = Field(default_factory=list)
+    refinement_prompt: str = ""
+
+
+class SessionStore:
+    """Wizard session states in SQLite, shared by all the app worker processes.
+
+    Saving only queues the latest state of a session; a background thread writes the
+    queued states every `flush_interval` seconds in one transaction, so snapshots can be
+    taken often without a disk write each. States unchanged since their last write are
+    skipped. Any worker can then load a session, e.g. after the one serving it crashed.
+
+    Every state is written on behalf of an owner, the page serving the session. A page that
+    restores a session claims it, and from then on the states of the previous owner (an
+    older tab, possibly on another worker) are rejected instead of overwriting the new ones.
+    """
+
+    def __init__(self, path: str = SESSION_STORE_PATH, flush_interval: float = SESSION_STORE_FLUSH_INTERVAL,
+                 ttl: float = SESSION_STORE_TTL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.ttl = ttl
+        self._conn = None
+        self._lock = threading.Lock()  # Guards the connection
+        self._pending = {}  # session_id -> (owner, state JSON) waiting to be written
+        self._written = {}  # session_id -> digest of the last state queued
+        self._superseded = set()  # (session_id, owner) of the pages whose session was claimed by another
+        self._pending_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._flusher = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS sessions ("
+                         "session_id TEXT PRIMARY KEY, owner TEXT NOT NULL, state TEXT NOT NULL, "
+                         "updated_at REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)")
+            self._conn = conn
+        return self._conn
+
+    def save(self, state: SessionState, owner: str):
+        """Queue `state` for the next flush, written only if `owner` still owns the session."""
+        data = state.model_dump_json()
+        digest = hashlib.sha256(data.encode("utf-8")).digest()
+        with self._pending_lock:
+            if self._written.get(state.session_id) == digest or (state.session_id, owner) in self._superseded:
+                return
+            self._written[state.session_id] = digest
+            self._pending[state.session_id] = (owner, data)
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._run, name="session-store-flush", daemon=True)
+                self._flusher.start()
+
+    def load(self, session_id: str):
+        """The saved state of `session_id`, or None if there is none (or it cannot be read)."""
+        with self._pending_lock:
+            data = self._pending.get(session_id, (None, None))[1]
+        if data is None:
+            with self._lock:
+                row = self._connection().execute("SELECT state FROM sessions WHERE session_id = ?",
+                                                  (session_id,)).fetchone()
+            if row is None:
+                return None
+            data = row[0]
+        try:
+            return SessionState.model_validate_json(data)
+        except ValueError as e:
+            log_message(f"Saved session state is invalid: {e}", level="warning", color=ConsoleColor.YELLOW,
+                        session_id=session_id)
+            return None
+
+    def claim(self, session_id: str, owner: str):
+        """Make `owner` the page serving `session_id`, e.g. when it restores the session."""
+        with self._pending_lock:
+            self._pending.pop(session_id, None)
+            self._written.pop(session_id, None)
+        with self._lock:
+            self._connection().execute("UPDATE sessions SET owner = ? WHERE session_id = ?", (owner, session_id))
+
+    def forget(self, session_id: str):
+        """Stop tracking a session closed in this process; its saved (or queued) state is kept."""
+        with self._pending_lock:
+            self._written.pop(session_id, None)
+            self._superseded = {entry for entry in self._superseded if entry[0] != session_id}
+
+    def prune(self):
+        """Delete the sessions not saved for longer than the TTL."""
+        with self._lock:
+            deleted = self._connection().execute("DELETE FROM sessions WHERE updated_at < ?",
+                                                 (time.time() - self.ttl,)).rowcount
+        if deleted:
+            log_message(f"Session store: deleted {deleted} expired sessions.")
+
+    def flush(self):
+        """Write the queued states now."""
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        now = time.time()
+        rejected = []
+        try:
+            with self._lock:
+                conn = self._connection()
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    for session_id, (owner, data) in pending.items():
+                        written = conn.execute(
+                            "INSERT INTO sessions (session_id, owner, state, updated_at) VALUES (?, ?, ?, ?) "
+                            "ON CONFLICT (session_id) DO UPDATE SET state = excluded.state, "
+                            "updated_at = excluded.updated_at WHERE sessions.owner = excluded.owner",
+                            (session_id, owner, data, now)).rowcount
+                        if not written:
+                            rejected.append((session_id, owner))
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+        except sqlite3.Error as e:
+            log_message(f"Session store: could not write {len(pending)} sessions: {e}", level="error",
+                        color=ConsoleColor.RED)
+            with self._pending_lock:
+                # Retried on the next flush, unless a newer state was queued meanwhile.
+                self._pending = {**pending, **self._pending}
+            return
+        with self._pending_lock:
+            self._superseded.update(rejected)
+        for session_id, _ in rejected:
+            log_message("Session store: the session is now served by another page, its state here is not saved.",
+                        level="warning", color=ConsoleColor.YELLOW, session_id=session_id)
+
+    def close(self):
+        """Write the queued states and stop the flush thread (on shutdown)."""
+        with self._pending_lock:
+            flusher, self._flusher = self._flusher, None
+        if flusher is not None:
+            self._wake.set()
+            flusher.join()
+        self.flush()
+
+    def _run(self):
+        while not self._wake.wait(self.flush_interval):
+            self.flush()
+        self._wake.clear()
+
+
+session_store = SessionStore()
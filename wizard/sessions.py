@@ -0,0 +1,61 @@
+# wizard/sessions.py
+
+import time
+from config import WIZARD_MAX_SESSIONS, WIZARD_SESSION_IDLE_TIMEOUT
+from logging_utils import log_message, ConsoleColor
+from wizard.session_state import session_store
+
+
+class SessionRegistry:
+    """Wizard sessions of the connected browser clients, one per page load.
+
+    A session ends when NiceGUI deletes its client (tab closed and not reconnected) or
+    when it has been idle for longer than `idle_timeout`, in which case its client is
+    deleted to free the page and its state. The last state of a closed session is kept in
+    the session store, so it can still be restored from its URL. Only used from the event loop.
+    """
+
+    def __init__(self, max_sessions: int = WIZARD_MAX_SESSIONS, idle_timeout: float = WIZARD_SESSION_IDLE_TIMEOUT):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self._sessions = {}  # session_id -> (wizard controller, NiceGUI client)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    def is_full(self) -> bool:
+        return len(self._sessions) >= self.max_sessions
+
+    def open(self, wizard, client):
+        self._sessions[wizard.session_id] = (wizard, client)
+        client.on_delete(lambda: self.close(wizard.session_id, "client disconnected"))
+        log_message(f"Wizard session opened ({len(self._sessions)} active).", session_id=wizard.session_id)
+
+    def close(self, session_id: str, reason: str):
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            try:
+                session_store.save(session[0].snapshot(), owner=session[0].page_token)
+            except Exception as e:
+                log_message(f"Could not save the closed session: {e}", level="warning",
+                            color=ConsoleColor.YELLOW, session_id=session_id)
+            session_store.forget(session_id)
+            log_message(f"Wizard session closed: {reason} ({len(self._sessions)} active).", session_id=session_id)
+
+    def collect_idle(self):
+        now = time.monotonic()
+        idle = [(session_id, client) for session_id, (wizard, client) in self._sessions.items()
+                if now - wizard.last_active > self.idle_timeout]
+        for session_id, client in idle:
+            self.close(session_id, f"idle for more than {self.idle_timeout:.0f}s")
+            try:
+                client.delete()
+            except Exception as e:
+                log_message(f"Could not delete the client of an idle session: {e}", level="warning",
+                            color=ConsoleColor.YELLOW, session_id=session_id)
+
+
+session_registry = SessionRegistry()
@@ -1,12 +1,21 @@
-import json
-import asyncio
+import time
 from nicegui import ui
 from logging_utils import log_message, ConsoleColor, trace
-from rag_integration import run_rag_system
 from openai_client import OpenAIClient
+from module_data import DEFAULT_MODULE_SIZES, changed_module_values, module_request_data, parse_module_response
+from prompt_builder import build_module_prompt
+from usage_meter import usage_meter
+from config import STREAM_UI_INTERVAL, WIZARD_MAX_MODULES
+from metrics import track_stage
+from file_manager import selected_data_dirs
+from wizard.prewarm import get_book_context
 
 @trace
 def add_module(wizard, prefill_data: dict = None):
+    wizard.touch()
+    if len(wizard.dynamic_modules) >= WIZARD_MAX_MODULES:
+        ui.notify(f"A plan can have at most {WIZARD_MAX_MODULES} modules.", color="red", position="top")
+        return
     # Use prefill_data for restored modules; otherwise assign new id
     module_id = prefill_data.get('module_id', len(wizard.dynamic_modules) + 1) if prefill_data else len(wizard.dynamic_modules) + 1
 
@@ -22,20 +31,23 @@ def add_module(wizard, prefill_data: dict = None):
 
             # Title, Headline, Subheadline
             with ui.row().classes("items-center gap-4 mb-3"):
-                title_input = ui.input(label="Title", placeholder="e.g. 'Introduction'")\
+                title_input = ui.input(label="Title", placeholder="e.g. 'Introduction'",
+                                       value=prefill_data.get('title', "") if prefill_data else "")\
                                 .classes("w-full")\
                                 .style("background-color: #f0f8ff;")
                 title_validation_label = ui.label().style("color: red; margin-left: 8px;")
     
             with ui.row().classes("items-center gap-4 mb-3"):
-                headline_input = ui.input(label="Headline", placeholder="Short, catchy phrase")\
+                headline_input = ui.input(label="Headline", placeholder="Short, catchy phrase",
+                                          value=prefill_data.get('headline', "") if prefill_data else "")\
                                    .classes("w-full")\
                                    .style("background-color: #f0f8ff;")
                 headline_char_count = ui.label("0 / 100").style("margin-left: 8px;")
     
             subheadline_input = ui.input(
                 label="Subheadline",
-                placeholder="Expand on the headline..."
+                placeholder="Expand on the headline...",
+                value=prefill_data.get('subheadline', "") if prefill_data else ""
             ).classes("w-full mb-3").style("background-color: #f0f8ff;")
     
             # Mockup Style Dropdown
@@ -56,25 +68,18 @@ def add_module(wizard, prefill_data: dict = None):
             # Testimonials
             testimonials_input = ui.input(
                 label="Testimonials",
-                placeholder="Enter testimonials"
+                placeholder="Enter testimonials",
+                value=prefill_data.get('testimonials', "") if prefill_data else ""
             ).classes("w-full mb-3").style("background-color: #f0f8ff;")
     
             # Prompt/Instructions
             prompt_textarea = ui.textarea(
                 label="Prompt/Instructions",
-                value="Improve this part"
+                value=prefill_data.get('prompt', "Improve this part") if prefill_data else "Improve this part"
             ).classes("w-full mb-3").style("height: 150px; background-color: #f0f8ff;")
     
             # Default Size
-            default_size = ""
-            if module_id == 1:
-                default_size = "970x600px Standard Image Header With Text"
-            elif module_id == 2:
-                default_size = "970x300px Standard Image & Light Text Overlay"
-            elif module_id == 3:
-                default_size = "4x220x220px Standard Four Images & Text"
-            elif module_id == 4:
-                default_size = "970x300px Standard Image & Light Text Overlay"
+            default_size = DEFAULT_MODULE_SIZES.get(module_id, "")
             size_input = ui.input(label="Size", value=prefill_data.get('size', default_size) if prefill_data else default_size)\
                            .classes("w-full mb-3").style("background-color: #f0f8ff;")
     
@@ -142,6 +147,7 @@ def add_module(wizard, prefill_data: dict = None):
     
             # Execution Output
             execution_output = ui.label("").classes("mt-2")
+            usage_label = ui.label("").classes("text-caption text-grey-7")
     
             # Basic Validations and Live Updates
             def validate_title(_):
@@ -170,80 +176,63 @@ def add_module(wizard, prefill_data: dict = None):
             testimonials_input.on('change', update_preview)
             prompt_textarea.on('change', update_preview)
     
-            # JSON parsing helper (unchanged)
+            # Current field values, keyed like prefill_data (see module_data.default_module_values)
+            def current_values() -> dict:
+                return {
+                    "module_id": module_id,
+                    "title": title_input.value,
+                    "headline": headline_input.value,
+                    "subheadline": subheadline_input.value,
+                    "chosen_mockup_style": chosen_mockup_style[0],
+                    "testimonials": testimonials_input.value,
+                    "prompt": prompt_textarea.value,
+                    "size": size_input.value,
+                    "color_primary": color_primary.value,
+                    "color_secondary": color_secondary.value,
+                    "color_accent": color_accent.value,
+                    "font_primary": font_primary.value,
+                    "font_secondary": font_secondary.value,
+                    "layout": layout_input.value,
+                    "image_desc_primary": image_desc_primary.value,
+                    "image_desc_secondary": image_desc_secondary.value,
+                    "tags": tags_textarea.value,
+                    "alignment": alignment_input.value,
+                }
+
+            value_inputs = {
+                "title": title_input,
+                "headline": headline_input,
+                "subheadline": subheadline_input,
+                "testimonials": testimonials_input,
+                "size": size_input,
+                "color_primary": color_primary,
+                "color_secondary": color_secondary,
+                "color_accent": color_accent,
+                "font_primary": font_primary,
+                "font_secondary": font_secondary,
+                "layout": layout_input,
+                "image_desc_primary": image_desc_primary,
+                "image_desc_secondary": image_desc_secondary,
+                "tags": tags_textarea,
+                "alignment": alignment_input,
+            }
+
+            # JSON parsing helper. Only the fields whose value changes are set: each one queues its
+            # element in the client outbox, which sends all of them in a single websocket message.
             def parse_and_fill_ui(resp_str: str):
                 try:
-                    data = json.loads(resp_str)
-                    mod_data = data["modules"][0]  # assume first module
-    
-                    if "title" in mod_data:
-                        title_input.value = mod_data["title"]
-                        title_input.update()
-                    if "headline" in mod_data:
-                        headline_input.value = mod_data["headline"]
-                        headline_input.update()
-                    if "subheadline" in mod_data:
-                        subheadline_input.value = mod_data["subheadline"]
-                        subheadline_input.update()
-                    if "mockup_style" in mod_data:
-                        chosen_mockup_style[0] = mod_data["mockup_style"]
-                    if "testimonials" in mod_data:
-                        testimonials_input.value = mod_data["testimonials"]
-                        testimonials_input.update()
-                    if "size" in mod_data:
-                        size_input.value = mod_data["size"]
-                        size_input.update()
-    
-                    da = mod_data.get("design_attributes", {})
-                    if isinstance(da, dict):
-                        cp = da.get("color_palette", {})
-                        if "primary" in cp:
-                            color_primary.value = cp["primary"]
-                            color_primary.update()
-                        if "secondary" in cp:
-                            color_secondary.value = cp["secondary"]
-                            color_secondary.update()
-                        if "accent" in cp:
-                            color_accent.value = cp["accent"]
-                            color_accent.update()
-    
-                        fn = da.get("fonts", {})
-                        if "primary" in fn:
-                            font_primary.value = fn["primary"]
-                            font_primary.update()
-                        if "secondary" in fn:
-                            font_secondary.value = fn["secondary"]
-                            font_secondary.update()
-    
-                        if "layout" in da:
-                            layout_input.value = da["layout"]
-                            layout_input.update()
-    
-                        idesc = da.get("image_descriptions", {})
-                        if "primary" in idesc:
-                            image_desc_primary.value = idesc["primary"]
-                            image_desc_primary.update()
-                        if "secondary" in idesc:
-                            image_desc_secondary.value = idesc["secondary"]
-                            image_desc_secondary.update()
-    
-                        if "tags" in da and isinstance(da["tags"], list):
-                            tags_textarea.value = ", ".join(str(t) for t in da["tags"])
-                            tags_textarea.update()
-    
-                        if "alignment" in da:
-                            alignment_input.value = da["alignment"]
-                            alignment_input.update()
-    
+                    with track_stage("parse_fill"):
+                        changes = changed_module_values(current_values(), parse_module_response(resp_str))
+                        if "chosen_mockup_style" in changes:
+                            chosen_mockup_style[0] = changes.pop("chosen_mockup_style")
+                        for key, value in changes.items():
+                            value_inputs[key].set_value(value)
                 except Exception as e:
                     log_message(f"Error parsing JSON: {e}", level="error", color=ConsoleColor.RED)
     
             async def execute_api():
-                spinner = None
-                def create_spinner():
-                    nonlocal spinner
-                    loading_spinner.style("display: inline-block;")
-                ui.timer(0, create_spinner, once=True)
+                wizard.touch()
+                loading_spinner.style("display: inline-block;")
     
                 try:
                     api_key = wizard.openai_client.api_key
@@ -251,145 +240,52 @@ def add_module(wizard, prefill_data: dict = None):
                         execution_output.set_text("No API key set. Please go back and set your OpenAI API key.")
                         return
     
-                    data_dir = wizard.root_directory_input.value.strip()
-                    if not data_dir:
-                        execution_output.set_text("No directory selected. Please go back to Step 1 and select a folder.")
+                    if not selected_data_dirs(wizard):
+                        execution_output.set_text("No folder selected. Please go back to Step 1 and select a folder.")
                         return
     
-                    persist_dir = "./client_books"
-                    loop = asyncio.get_event_loop()
-                    rag_result = await loop.run_in_executor(
-                        None,
-                        lambda: run_rag_system(api_key=api_key, persist_dir=persist_dir, data_dir=data_dir)
-                    )
-    
-                    final_data = {
-                        "structure_type": wizard.structure_type.value if wizard.structure_type else None,
-                        "modules": [
-                            {
-                                "module_id": module_id,
-                                "title": title_input.value,
-                                "headline": headline_input.value,
-                                "subheadline": subheadline_input.value,
-                                "mockup_style": chosen_mockup_style[0],
-                                "testimonials": testimonials_input.value,
-                                "size": size_input.value,
-                                "book_of_interest": rag_result,
-                                "design_attributes": {
-                                    "color_palette": {
-                                        "primary": color_primary.value,
-                                        "secondary": color_secondary.value,
-                                        "accent": color_accent.value
-                                    },
-                                    "fonts": {
-                                        "primary": font_primary.value,
-                                        "secondary": font_secondary.value
-                                    },
-                                    "layout": layout_input.value,
-                                    "image_descriptions": {
-                                        "primary": image_desc_primary.value,
-                                        "secondary": image_desc_secondary.value
-                                    },
-                                    "tags": [tag.strip() for tag in tags_textarea.value.split(",")],
-                                    "alignment": alignment_input.value
-                                }
-                            }
-                        ]
-                    }
-    
-                    # Updated module prompt with new text
-                    module_prompt = f"""
-                    Take a deep breath and generate only one comprehensive module description for a book of interest. ACT as a holywood movie poster creator 
-                    that is preparing a book marketing campaign in strict JSON format, incorporating all provided details exactly as given.
-                    <Requirements>
-                    Golden Rule:
-                    Treat the book as more than just pages with words—it's a gateway to an experience. Every element of the campaign should convey the journey the reader will embark upon.
-                    Understand the Book's Core Essence
-                        Read or thoroughly research the book to grasp its central theme, narrative, and value proposition.
-                        Identify the core message and the author's intent—what transformation does the reader experience after engaging with this book?
-                        Summarize the book in one compelling sentence to clarify its essence for the campaign.
-                    Define the Target Audience with Precision
-                        Identify the book's primary and secondary audiences based on genre, themes, and style.
-                        Build audience personas that detail demographics, motivations, and reading behaviors.
-                        Understand emotional drivers: What does the audience seek—entertainment, education, inspiration, or transformation?
-                    Craft Messaging that Resonates
-                        Develop a clear value proposition: Why should someone read this book over others in the same genre?
-                        Craft headlines that evoke curiosity and emotion. Lead with the book's most intriguing aspect or boldest claim.
-                        Ensure subheadlines provide clarity, context, and compelling reasons to continue reading.
-                        Avoid generic language like “must-read” or “unputdownable.” Instead, focus on the book's unique impact on the reader's life.
-                    Visual Storytelling and Branding
-                        Identify visual themes that align with the book's genre and mood (e.g., soft pastels for romance, bold contrasts for thrillers, minimalism for non-fiction).
-                        Create mood boards that capture the book's essence—characters, settings, and core ideas should be visually represented.
-                        Choose color schemes that evoke the desired emotional response: warm tones for comfort, cool tones for intellectual themes, vibrant accents for excitement.
-                        Ensure all visual materials maintain a consistent style across platforms to reinforce brand recognition.
-                    Master Tone and Voice
-                        Adjust the tone to suit the genre:
-                            Fiction: Imaginative, emotionally evocative.
-                            Non-fiction: Authoritative yet relatable.
-                            Self-help: Motivational and solution-oriented.
-                            Memoir: Authentic and deeply personal.
-                        Develop brand guidelines that define the campaign's voice, ensuring consistency across all materials.
-                    <Good Example>
-                    "structure_type": "Module",
-                    "modules": 
-                        "title": "The Society of Mind: Exploring the Architecture of Thought",
-                        "headline": "Embark on a Journey into the Mind's Inner Workings",
-                        "subheadline": "Marvin Minsky unveils a groundbreaking perspective on how simple components collaborate to create the tapestry of human thought.",
-                        "mockup_style": "Open Book Display",
-                        "testimonials": "A profound and fascinating book that lays down the foundations for the solution of one of the last great problems of modern science.",
-                        "size": "970x600px Standard Image Header with Text",
-                        "book_of_interest": "The Society of Mind by Marvin Minsky",
-                        "design_attributes": 
-                            "color_palette": 
-                            "primary": "#2C3E50",
-                            "secondary": "#8E44AD",
-                            "accent": "#3498DB",
-                            "fonts": 
-                            "primary": "Arial",
-                            "secondary": "Times New Roman",
-                            "layout": "Balanced, single-column layout",
-                            "image_descriptions":
-                            "primary": "Cover art depicting a stylized sphere composed of interlocking geometric shapes, symbolizing the complexity and unity of the mind.",
-                            "secondary": "Interior illustrations featuring interconnected diagrams and conceptual imagery that bring the book's theories to life.",
-                            "tags": 
-                            "cognitive science",
-                            "artificial intelligence",
-                            "Marvin Minsky",
-                            "human cognition",
-                            "alignment": "centered"
-                    <Bad Example>
-                    Visual: A 3D mockup of the book cover.
-                    Headline: A vague, clichéd headline with overused phrases.
-                    Example: "Delve into the world of endless possibilities and unleash the power of transformation."
-                    Subheadline: A generic subheadline that fails to highlight specific benefits.
-                    Example: "Learn everything you need to know about success and growth."
-    
-                    [TARGET] ALWAYS Strictly output a JSON containing all necessary information like so:
-                    {json.dumps(final_data, indent=2)}
-                    """
-    
-                    response = await loop.run_in_executor(
-                        None,
-                        lambda: wizard.openai_client.get_response(module_prompt, max_tokens=1050)
-                    )
+                    # Joins the job started when Step 1 was validated, if it is still running.
+                    rag_result = await get_book_context(wizard)
+    
+                    structure_type = wizard.structure_type.value if wizard.structure_type else None
+                    final_data = module_request_data(current_values(), structure_type)
+    
+                    # Static instructions and book profile first, per-module fields last, so the
+                    # prefix is identical for every module of the book and evaluated only once.
+                    module_prefix, module_suffix = build_module_prompt(rag_result, final_data)
+    
+                    # Render tokens as they arrive, throttled to keep websocket traffic low.
+                    tokens = []
+                    last_push = 0.0
+                    async for token in wizard.openai_client.stream_response(module_suffix, max_tokens=1050,
+                                                                            prefix=module_prefix,
+                                                                            session_id=wizard.session_id,
+                                                                            regenerate=regenerate_checkbox.value,
+                                                                            module_id=module_id):
+                        tokens.append(token)
+                        now = time.monotonic()
+                        if now - last_push >= STREAM_UI_INTERVAL:
+                            execution_output.set_text("".join(tokens))
+                            last_push = now
+                    response = "".join(tokens).strip()
     
                     execution_output.set_text(response)
+                    usage_label.set_text(usage_meter.module_totals(wizard.session_id, module_id).summary())
                     log_message("Module API call executed with RAG data included.",
                                 session_id=f"MODULE_{module_id}", color=ConsoleColor.GREEN)
-    
-                    def parse_later():
-                        parse_and_fill_ui(response)
-    
-                    ui.timer(0, parse_later, once=True)
+                    # Applied right away rather than from a ui.timer, so the fields go out in the
+                    # same outbox flush as the final text.
+                    parse_and_fill_ui(response)
     
                 except Exception as e:
                     error_msg = f"Error in execute_api: {e}"
                     execution_output.set_text(error_msg)
                     log_message(error_msg, level="error", color=ConsoleColor.RED)
                 finally:
-                    ui.timer(0, lambda: loading_spinner.style("display: none;"), once=True)
+                    loading_spinner.style("display: none;")
     
             ui.button("Execute", on_click=execute_api).classes("bg-blue text-white px-4 py-2 rounded m-2")
+            regenerate_checkbox = ui.checkbox("Regenerate (ignore cache)", value=False).classes("m-2")
             ui.button("Remove This Module", on_click=lambda: remove_module(wizard, module_id, module_row))\
               .classes("bg-red text-white px-4 py-2 rounded m-2")
         ui.separator().classes("my-4")
@@ -414,7 +310,9 @@ def add_module(wizard, prefill_data: dict = None):
         "tags_textarea": tags_textarea,
         "alignment_input": alignment_input,
         "chosen_mockup_style": chosen_mockup_style,
-        "execution_output": execution_output
+        "execution_output": execution_output,
+        "values": current_values,
+        "fill": parse_and_fill_ui
     })
 
 @trace
@@ -428,25 +326,7 @@ def remove_module(wizard, module_id, container):
         # Store current input values for undo
         wizard.deleted_modules.append({
             "module_id": module_id,
-            "values": {
-                "title": module["title"].value,
-                "headline": module["headline"].value,
-                "subheadline": module["subheadline"].value,
-                "testimonials": module["testimonials"].value,
-                "prompt": module["prompt"].value,
-                "size": module["size"].value,
-                "color_primary": module["color_primary"].value,
-                "color_secondary": module["color_secondary"].value,
-                "color_accent": module["color_accent"].value,
-                "font_primary": module["font_primary"].value,
-                "font_secondary": module["font_secondary"].value,
-                "layout": module["layout_input"].value,
-                "image_desc_primary": module["image_desc_primary"].value,
-                "image_desc_secondary": module["image_desc_secondary"].value,
-                "tags": module["tags_textarea"].value,
-                "alignment": module["alignment_input"].value,
-                "chosen_mockup_style": module["chosen_mockup_style"][0],
-            }
+            "values": {key: value for key, value in module["values"]().items() if key != "module_id"}
         })
         container.delete()
         wizard.dynamic_modules = [m for m in wizard.dynamic_modules if m["id"] != module_id]
@@ -1,17 +1,32 @@
 # wizard/ui_builder.py
 
 from concurrent.futures import ThreadPoolExecutor
-from nicegui import ui
+from fastapi.responses import PlainTextResponse
+from nicegui import Client, app, ui
 from wizard.wizard_controller import WizardController
 from file_manager import open_directory_picker, flush_directory, list_subfolders
 from openai_client import OpenAIClient
+from llm_client import ollama_client
+from llm_scheduler import PRIORITY_BULK, PRIORITY_INTERACTIVE
+from usage_meter import usage_meter
+from metrics import CONTENT_TYPE, render_metrics
 from logging_utils import log_message, ConsoleColor, trace
 
 from wizard.steps.modules import add_module
-import threading
+from wizard.prewarm import start_prewarm, build_prewarm_status
+from wizard.sessions import session_registry
+from wizard.session_state import session_store
+from config import SESSION_SNAPSHOT_INTERVAL, WIZARD_ACTIVITY_THROTTLE, WIZARD_PORT
+from module_data import plan_entry, format_plan
 
 import asyncio
 
+@app.get("/metrics", include_in_schema=False)
+def metrics_endpoint():
+    """Pipeline stage latencies, counters and in-flight gauges for Prometheus."""
+    return PlainTextResponse(render_metrics(), media_type=CONTENT_TYPE)
+
+
 @trace
 async def populate_modules_in_parallel(wizard_controller, openai_client):
     """Trigger parallel OpenAI API calls for each module in Step 3."""
@@ -19,7 +34,9 @@ async def populate_modules_in_parallel(wizard_controller, openai_client):
         prompt_text = module["prompt"].value
         size = module["size"].value
         prompt_with_size = f"{prompt_text} Size: {size}."
-        response = await openai_client.get_response(prompt_with_size, max_tokens=150)
+        response = await openai_client.get_response(prompt_with_size, max_tokens=150,
+                                                    session_id=wizard_controller.session_id, priority=PRIORITY_BULK,
+                                                    module_id=module["id"])
         module["execution_output"].set_text(response)
         log_message(f"Module {module['id']} populated.", session_id=f"MODULE_{module['id']}", color=ConsoleColor.GREEN)
         return response
@@ -28,11 +45,45 @@ async def populate_modules_in_parallel(wizard_controller, openai_client):
     await asyncio.gather(*tasks)
 
 
-@trace
-def setup_wizard_ui():
-    wizard_controller = WizardController()
+def add_bonus_module_field(wizard_controller, values=None):
+    with wizard_controller.bonus_customization_container:
+        with ui.row().classes('items-center'):
+            bonus_title = ui.input(label="Bonus Module Title", value=values.title if values else "")
+            bonus_desc = ui.input(label="Bonus Module Description", value=values.description if values else "")
+            bonus_prompt = ui.textarea(
+                label="Prompt/Instructions",
+                value=values.prompt if values else "Enter your prompt here..."
+            ).style("height: 150px")
+            wizard_controller.bonus_inputs.append({
+                "bonus_title": bonus_title,
+                "bonus_desc": bonus_desc,
+                "bonus_prompt": bonus_prompt
+            })
+
+
+async def build_wizard_page(client: Client, session: str = None):
+    """Build the wizard for one browser client, with its own controller, model client and session.
+
+    The page URL carries the session id (`/?session=...`): reloading it, on this worker or on
+    another one after a crash, rebuilds the wizard from the state saved in the session store.
+    """
+    # The session store runs off the event loop: it may wait on the writes of other workers.
+    state = None
+    if session and session not in session_registry:
+        state = await asyncio.to_thread(session_store.load, session)
+    if session_registry.is_full():
+        ui.label("All wizard sessions are in use. Please try again in a few minutes.").classes("text-h6 m-8")
+        return
+    # A session still open in another tab of this worker is not shared: the new tab starts afresh.
+    if state and state.session_id in session_registry:
+        state = None
+    wizard_controller = WizardController(session_id=state.session_id if state else None)
     openai_client = OpenAIClient()
     wizard_controller.openai_client = openai_client  # Save the instance in the controller
+    session_registry.open(wizard_controller, client)
+    if state:
+        # From now on, the page that served the session before (if any) no longer saves it.
+        await asyncio.to_thread(session_store.claim, state.session_id, wizard_controller.page_token)
 
     # Add custom CSS and Topbar
     ui.add_head_html("""
@@ -63,7 +114,13 @@ def setup_wizard_ui():
       </div>
     </div>
     """)
-    wizard_ui = ui.stepper().props('horizontal').classes('w-full p-8 lg:p-16 max-w-[1600px] mx-auto')
+    build_prewarm_status(wizard_controller).classes("mt-24 px-8")
+    wizard_ui = ui.stepper(value=state.step if state and state.step else None,
+                           on_value_change=wizard_controller.touch).props('horizontal').classes('w-full p-8 lg:p-16 max-w-[1600px] mx-auto')
+    wizard_controller.wizard_ui = wizard_ui
+    # Edits of any field (module fields included) bubble up to the stepper: one throttled listener each.
+    for event in ("keydown", "click"):
+        wizard_ui.on(event, wizard_controller.touch, [], throttle=WIZARD_ACTIVITY_THROTTLE)
 
     with wizard_ui:
         # ─────────────────────────────────────────────────────────
@@ -74,7 +131,8 @@ def setup_wizard_ui():
             ui.label("Select your project folder:").classes("text-h6 mt-4")
             with ui.row().classes("items-center"):
                 wizard_controller.root_directory_input = ui.input(
-                    placeholder="No directory selected"
+                    placeholder="No directory selected",
+                    value=state.root_directory if state else ""
                 ).props('readonly').classes("w-full")
                 ui.button("Select Directory", on_click=lambda:
                           open_directory_picker(wizard_controller.root_directory_input)
@@ -95,7 +153,8 @@ def setup_wizard_ui():
             
             ui.label("Select Book Genre:").classes("text-h6 mt-4")
             genres = ["Self-Help", "Fiction", "Non-Fiction", "Mystery", "Sci-Fi"]
-            wizard_controller.book_type_input = ui.select(genres, value="Self-Help").classes("w-full")
+            book_type = state.book_type if state and state.book_type in genres else "Self-Help"
+            wizard_controller.book_type_input = ui.select(genres, value=book_type).classes("w-full")
             
             with ui.stepper_navigation():
                 def validate_basic_setup():
@@ -114,7 +173,8 @@ def setup_wizard_ui():
                             ui.notify("Please tick at least one subfolder.", color="red")
                             return
 
-                    # All validations passed → move to Step 2
+                    # All validations passed → prepare the book in the background and move to Step 2
+                    start_prewarm(wizard_controller)
                     wizard_ui.next()
                 ui.button("Next", on_click=validate_basic_setup).classes("bg-blue text-white px-4 py-2 rounded")
 
@@ -125,7 +185,9 @@ def setup_wizard_ui():
             ui.label("Step 2: Module Structure & Type").classes("text-h5")
             ui.label("Choose how you want to build your modules:").classes("text-body1")
             # For example, a selection between different methods:
-            wizard_controller.structure_type = ui.select(["Generate", "Select", "Manual"], value="Generate").classes("w-full")
+            structure_types = ["Generate", "Select", "Manual"]
+            structure_type = state.structure_type if state and state.structure_type in structure_types else "Generate"
+            wizard_controller.structure_type = ui.select(structure_types, value=structure_type).classes("w-full")
             with ui.stepper_navigation():
                 ui.button("Back", on_click=wizard_ui.previous).classes("bg-blue text-white px-4 py-2 rounded")
                 ui.button("Next", on_click=wizard_ui.next).classes("bg-blue text-white px-4 py-2 rounded")
@@ -137,32 +199,29 @@ def setup_wizard_ui():
             ui.label("Step 3: Module Contents").classes("text-h5")
             ui.label("Customize the content for each module:").classes("text-body1")
             wizard_controller.module_customization_container = ui.row().classes("flex-wrap gap-4 items-start")
-            # Pre-create 4 modules
-            for _ in range(4):
-                add_module(wizard_controller)
+            if state and state.modules:
+                for module in state.modules:
+                    add_module(wizard_controller, prefill_data=module.model_dump())
+                wizard_controller.deleted_modules = [
+                    {"module_id": module.module_id, "values": module.model_dump(exclude={"module_id"})}
+                    for module in state.deleted_modules]
+            else:
+                # Pre-create 4 modules
+                for _ in range(4):
+                    add_module(wizard_controller)
             ui.button("Add Module", on_click=lambda: add_module(wizard_controller)).classes("bg-green text-white m-2")
             
             # Bonus Modules (if structure_type is "Generate" and bonus is enabled)
             with ui.column():
                 ui.label("Bonus Module Customization (optional)").classes("text-h6 mt-4")
                 wizard_controller.bonus_customization_container = ui.column()
-                def add_bonus_module_field():
-                    with wizard_controller.bonus_customization_container:
-                        with ui.row().classes('items-center'):
-                            bonus_title = ui.input(label="Bonus Module Title")
-                            bonus_desc = ui.input(label="Bonus Module Description")
-                            bonus_prompt = ui.textarea(
-                                label="Prompt/Instructions",
-                                value="Enter your prompt here..."
-                            ).style("height: 150px")
-                            wizard_controller.bonus_inputs.append({
-                                "bonus_title": bonus_title,
-                                "bonus_desc": bonus_desc,
-                                "bonus_prompt": bonus_prompt
-                            })
+                for bonus in state.bonus_modules if state else []:
+                    add_bonus_module_field(wizard_controller, bonus)
+                def add_bonus_module():
+                    add_bonus_module_field(wizard_controller)
                     ui.notify("Bonus module field added", color="green", position="top")
                     log_message("Bonus module field added.", session_id=wizard_controller.session_id)
-                ui.button("Add Bonus Module", on_click=add_bonus_module_field).classes("m-2 bg-green text-white")
+                ui.button("Add Bonus Module", on_click=add_bonus_module).classes("m-2 bg-green text-white")
             
             with ui.stepper_navigation():
                 ui.button("Back", on_click=wizard_ui.previous).classes("bg-blue text-white px-4 py-2 rounded")
@@ -178,24 +237,34 @@ def setup_wizard_ui():
         with ui.step('Step 4: Content Generation & Refining'):
             ui.label("Step 4: Content Generation & Refining").classes("text-h5")
             # Example: Propose Headlines
-            def propose_headlines():
+            async def propose_headlines():
+                wizard_controller.touch()
                 prompt = "Generate 3 compelling, distinct headlines for the book based on its modules and style."
-                def call_api():
-                    headlines_text = openai_client.get_response(prompt, max_tokens=150)
-                    headlines = [line.strip() for line in headlines_text.split("\n") if line.strip()]
-                    wizard_controller.proposed_headlines = headlines
-                    wizard_controller.headline_output.content = "\n".join(f"- {h}" for h in headlines)
-                    ui.notify("Headlines proposed", color="green", position="top")
-                    log_message("Headlines generated.", session_id=wizard_controller.session_id)
-                threading.Thread(target=call_api).start()
+                headlines_text = await openai_client.get_response(prompt, max_tokens=150,
+                                                                  session_id=wizard_controller.session_id,
+                                                                  priority=PRIORITY_INTERACTIVE,
+                                                                  module_id="headlines")
+                headlines = [line.strip() for line in headlines_text.split("\n") if line.strip()]
+                wizard_controller.proposed_headlines = headlines
+                wizard_controller.headline_output.content = "\n".join(f"- {h}" for h in headlines)
+                ui.notify("Headlines proposed", color="green", position="top")
+                log_message("Headlines generated.", session_id=wizard_controller.session_id)
             ui.button("Propose Headlines", on_click=propose_headlines).classes("m-2 bg-blue text-white")
             wizard_controller.headline_output = ui.markdown("Proposed headlines will appear here")
+            if state and state.proposed_headlines:
+                wizard_controller.proposed_headlines = state.proposed_headlines
+                wizard_controller.headline_output.content = "\n".join(f"- {h}" for h in state.proposed_headlines)
+            wizard_controller.refinement_prompt = state.refinement_prompt if state else ""
             ui.textarea(
                 label="Refinement Prompt",
                 placeholder="Enter refinement prompt here...",
+                value=wizard_controller.refinement_prompt,
                 on_change=lambda e: setattr(wizard_controller, 'refinement_prompt', e.value)
             ).classes("m-2").style("min-height: 100px;")
             ui.button("Refine Content", on_click=lambda: ui.notify("Content refining triggered", color="green", position="top")).classes("m-2 bg-blue text-white")
+            session_usage_label = ui.label("").classes("m-2 text-caption text-grey-7")
+            ui.timer(5.0, lambda: session_usage_label.set_text(
+                "Session usage: " + usage_meter.session_totals(wizard_controller.session_id).summary()))
             with ui.stepper_navigation():
                 ui.button("Back", on_click=wizard_ui.previous).classes("bg-blue text-white px-4 py-2 rounded")
                 ui.button("Next", on_click=wizard_ui.next).classes("bg-blue text-white px-4 py-2 rounded")
@@ -209,18 +278,8 @@ def setup_wizard_ui():
             with ui.stepper_navigation():
                 ui.button("Back", on_click=wizard_ui.previous).classes("bg-blue text-white px-4 py-2 rounded")
                 def finalize_plan():
-                    module_data = []
-                    for mod in wizard_controller.dynamic_modules:
-                        module_data.append({
-                            "module_title": mod["title"].value,
-                            "headline": mod["headline"].value,
-                            "subheadline": mod["subheadline"].value,
-                            "mockup_style": mod["mockup_select"].value,
-                            "testimonials": mod["testimonials"].value,
-                            "prompt": mod["prompt"].value,
-                            "size": mod["size"].value,
-                        })
-                    final_plan = f"Plan created with {len(module_data)} modules:\n" + "\n".join(str(module) for module in module_data)
+                    module_data = [plan_entry(mod["values"]()) for mod in wizard_controller.dynamic_modules]
+                    final_plan = format_plan(module_data)
                     wizard_controller.final_output_display.content = final_plan
                     ui.notify("Final plan generated.", color="green", position="top")
                     log_message(f"Plan created with {len(module_data)} modules.", session_id=wizard_controller.session_id)
@@ -235,7 +294,32 @@ def setup_wizard_ui():
     </div>
     """)
 
-    ui.run(title="A+ Content Plan Generator")
+    async def start_session():
+        # Reloading the page (or reconnecting to another worker) now restores this session.
+        ui.navigate.history.replace(f"/?session={wizard_controller.session_id}")
+        if state:
+            if state.subfolders:
+                await list_subfolders(wizard_controller, selected=state.subfolders)
+            ui.notify("Session restored. Please enter your API key again.", color="green", position="top")
+            log_message("Wizard session restored from the session store.", session_id=wizard_controller.session_id)
+        # Started once restored, not to save the subfolders before they are ticked again.
+        # Write-behind: snapshots are cheap and unchanged ones are not written.
+        ui.timer(SESSION_SNAPSHOT_INTERVAL, lambda: session_store.save(wizard_controller.snapshot(),
+                                                                       owner=wizard_controller.page_token))
+    ui.timer(0, start_session, once=True)
+
+
+@trace
+def setup_wizard_ui():
+    # Built per page load: every browser tab gets its own wizard session.
+    ui.page("/")(build_wizard_page)
+    app.timer(60.0, session_registry.collect_idle)
+    app.timer(3600.0, lambda: asyncio.to_thread(session_store.prune))
+    app.on_shutdown(ollama_client.aclose)
+    app.on_shutdown(session_store.close)
+    # No auto-reload: its server process would import the entry script as "__mp_main__",
+    # a name that the spawned indexing and parsing workers use too.
+    ui.run(title="A+ Content Plan Generator", port=WIZARD_PORT, reload=False)
 
-if __name__ in {"__main__", "__mp_main__"}:
+if __name__ == "__main__":
     setup_wizard_ui()
@@ -1,14 +1,19 @@
 # wizard/wizard_controller.py
 
+import time
 import uuid
 from logging_utils import log_message, ConsoleColor, trace
+from wizard.session_state import SessionState, ModuleState, BonusModuleState
 
 @trace
 class WizardController:
-    def __init__(self):
+    def __init__(self, session_id: str = None):
         self.current_step = 1
-        self.session_id = uuid.uuid4().hex
+        self.session_id = session_id or uuid.uuid4().hex  # Given when a saved session is restored
+        self.page_token = uuid.uuid4().hex  # Owner of the session in the session store
         self.openai_client = None  # Save the instance in the controller
+        self.prewarm_job = None  # Background index + book profile build (wizard/prewarm.py)
+        self.last_active = time.monotonic()  # Idle sessions are closed (wizard/sessions.py)
 
         # Step 1 fields
         self.root_directory_input = None
@@ -33,11 +38,37 @@ class WizardController:
         self.final_layout = None
 
         # UI Step containers (for direct manipulation if needed)
+        self.wizard_ui = None  # The stepper
         self.step1 = None
         self.step2 = None
         self.step3 = None
         self.step4 = None
 
+    def touch(self):
+        """Record user activity, keeping the session from being collected as idle."""
+        self.last_active = time.monotonic()
+
+    def snapshot(self) -> SessionState:
+        """Serializable state of the session, read from its widgets (see wizard/session_state.py)."""
+        root = self.root_directory_input.value.strip() if self.root_directory_input else ""
+        return SessionState(
+            session_id=self.session_id,
+            step=self.wizard_ui.value if self.wizard_ui else "",
+            root_directory=root,
+            subfolders=[folder for folder, cb in self.subfolder_checkboxes if cb.value],
+            book_type=self.book_type_input.value if self.book_type_input else None,
+            structure_type=self.structure_type.value if getattr(self, "structure_type", None) else None,
+            modules=[ModuleState(**module["values"]()) for module in self.dynamic_modules],
+            deleted_modules=[ModuleState(module_id=deleted["module_id"], **deleted["values"])
+                             for deleted in getattr(self, "deleted_modules", [])],
+            bonus_modules=[BonusModuleState(title=bonus["bonus_title"].value or "",
+                                            description=bonus["bonus_desc"].value or "",
+                                            prompt=bonus["bonus_prompt"].value or "")
+                           for bonus in self.bonus_inputs],
+            proposed_headlines=self.proposed_headlines,
+            refinement_prompt=self.refinement_prompt,
+        )
+
     def next_step(self, wizard_ui):
         """Advance to the next step with conditional logic."""
         try: